@@ -0,0 +1,205 @@
+"""
+Ingest Binance bulk data archives into the kline store, offline.
+
+Binance publishes monthly zipped CSVs at data.binance.vision, e.g.
+    spot/monthly/klines/USDTTRY/1m/USDTTRY-1m-2024-01.zip
+    spot/monthly/aggTrades/USDTTRY/USDTTRY-aggTrades-2024-01.zip
+Rows are streamed out of the zip (never extracted to disk) in chunks, only the
+columns the store keeps are decoded, and aggTrades are rolled up into klines of
+the requested interval. Newer archives include a header line and, from 2025 on,
+microsecond timestamps; both are handled.
+
+Usage:
+    python -m common.archive USDTTRY-1m-2023-*.zip
+    python -m common.archive --interval 1m USDTTRY-aggTrades-2024-01.zip
+"""
+import argparse
+import io
+import itertools
+import os
+import re
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from .binance import interval_ms
+from .kline_store import COLUMNS, KlineStore
+
+CHUNK_ROWS = 250_000
+# Store column -> position in a kline CSV row
+KLINE_CSV_COLUMNS = {"open_time": 0, "open": 1, "high": 2, "low": 3, "close": 4, "volume": 5,
+                     "quote_volume": 7, "trades": 8}
+# aggTrades CSV: agg_trade_id, price, quantity, first_trade_id, last_trade_id, transact_time, is_buyer_maker, ...
+AGG_CSV_COLUMNS = {"price": 1, "quantity": 2, "first_trade_id": 3, "last_trade_id": 4, "time": 5}
+ARCHIVE_NAME = re.compile(r"^(?P<symbol>[A-Z0-9]+)-(?P<kind>aggTrades|\d+[smhdwM])-(?P<period>\d{4}-\d{2}(-\d{2})?)\.zip$")
+MICROSECONDS_FROM = 10 ** 14 # Millisecond timestamps stay below this until the year 5138
+
+
+def parse_archive_name(path):
+    """
+    Returns (symbol, kind, period), kind being a kline interval or "aggTrades".
+    """
+    match = ARCHIVE_NAME.match(os.path.basename(path))
+    if not match:
+        raise ValueError(f"Not a Binance archive name: {os.path.basename(path)}")
+    return match["symbol"], match["kind"], match["period"]
+
+
+def _to_ms(values):
+    values = np.asarray(values, dtype=np.int64)
+    return values // 1000 if len(values) and values[0] >= MICROSECONDS_FROM else values
+
+
+def read_csv_chunks(path, columns, chunk_rows=CHUNK_ROWS):
+    """
+    Streams {name: array} chunks of the given {name: csv position} columns from
+    the single CSV inside a Binance zip archive.
+    """
+    with zipfile.ZipFile(path) as archive:
+        member = archive.namelist()[0]
+        with archive.open(member) as raw:
+            first = raw.readline()
+        has_header = not first[:1].isdigit()
+
+        names = sorted(columns, key=columns.get)
+        with archive.open(member) as raw:
+            reader = pd.read_csv(io.TextIOWrapper(raw, encoding="ascii"), header=None,
+                                 skiprows=1 if has_header else 0, usecols=[columns[n] for n in names],
+                                 chunksize=chunk_rows)
+            for chunk in reader:
+                yield {name: chunk[columns[name]].to_numpy() for name in names}
+
+
+def iter_kline_chunks(path, chunk_rows=CHUNK_ROWS):
+    """
+    Streams store-ready kline column chunks out of a klines archive.
+    """
+    for chunk in read_csv_chunks(path, KLINE_CSV_COLUMNS, chunk_rows):
+        chunk["open_time"] = _to_ms(chunk["open_time"])
+        yield {name: np.asarray(chunk[name], dtype=dtype) for name, dtype in COLUMNS.items()}
+
+
+def _roll_up(bucket, price, quantity, trades, step, previous_close, next_bucket):
+    """
+    Klines for sorted aggTrades. Minutes without trades between next_bucket and
+    the last trade become flat zero-volume candles at the previous close, as on Binance.
+    """
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    traded = bucket[starts]
+    first = traded[0] if next_bucket is None else next_bucket
+    open_time = np.arange(first, traded[-1] + step, step, dtype=np.int64)
+    slot = (traded - first) // step
+
+    ends = np.r_[starts[1:], len(bucket)]
+    close = np.full(len(open_time), np.nan)
+    close[slot] = price[ends - 1]
+    close = pd.Series(close).ffill().fillna(previous_close).to_numpy()
+
+    columns = {name: np.zeros(len(open_time), dtype=dtype) for name, dtype in COLUMNS.items()}
+    columns["open_time"] = open_time
+    columns["close"] = close
+    flat = np.r_[previous_close, close[:-1]] # Empty candles open (and stay) at the previous close
+    columns["open"], columns["high"], columns["low"] = flat.copy(), flat.copy(), flat.copy()
+    columns["open"][slot] = price[starts]
+    columns["high"][slot] = np.maximum.reduceat(price, starts)
+    columns["low"][slot] = np.minimum.reduceat(price, starts)
+    columns["volume"][slot] = np.add.reduceat(quantity, starts)
+    columns["quote_volume"][slot] = np.add.reduceat(price * quantity, starts)
+    columns["trades"][slot] = np.add.reduceat(trades, starts)
+    return columns
+
+
+def iter_agg_kline_chunks(path, interval, chunk_rows=CHUNK_ROWS):
+    """
+    Streams klines built from an aggTrades archive. The trades of the last
+    (possibly incomplete) candle of each chunk are held back for the next one.
+    """
+    step = interval_ms(interval)
+    previous_close, next_bucket = np.nan, None
+    pending = None
+
+    for chunk in itertools.chain(read_csv_chunks(path, AGG_CSV_COLUMNS, chunk_rows), [None]):
+        if chunk is None: # Archive exhausted: the held-back candle is complete now
+            if pending is None or len(pending["time"]) == 0:
+                return
+            trades = pending
+        else:
+            trades = {
+                "time": _to_ms(chunk["time"]),
+                "price": np.asarray(chunk["price"], dtype=np.float64),
+                "quantity": np.asarray(chunk["quantity"], dtype=np.float64),
+                "trades": np.asarray(chunk["last_trade_id"] - chunk["first_trade_id"] + 1, dtype=np.int64),
+            }
+            if pending is not None:
+                trades = {name: np.concatenate([pending[name], trades[name]]) for name in trades}
+            if len(trades["time"]) == 0:
+                continue
+
+        bucket = trades["time"] // step * step
+        cut = len(bucket) if chunk is None else int(np.searchsorted(bucket, bucket[-1], side="left"))
+        pending = {name: values[cut:] for name, values in trades.items()}
+        if cut == 0:
+            continue
+
+        columns = _roll_up(bucket[:cut], trades["price"][:cut], trades["quantity"][:cut], trades["trades"][:cut],
+                           step, previous_close, next_bucket)
+        previous_close, next_bucket = columns["close"][-1], columns["open_time"][-1] + step
+        yield columns
+
+
+def ingest_archives(paths, interval=None, store=None):
+    """
+    Adds the candles of klines/aggTrades archives to the store. Candles newer
+    than the stored series are appended chunk by chunk; older ones are
+    prepended in one rewrite at the end. Returns {(symbol, interval): added}.
+    interval is required for aggTrades archives.
+    """
+    store = store or KlineStore()
+    series = {}
+    for path in paths:
+        symbol, kind, period = parse_archive_name(path)
+        if kind == "aggTrades" and interval is None:
+            raise ValueError(f"{os.path.basename(path)}: aggTrades archives need an interval")
+        series.setdefault((symbol, interval if kind == "aggTrades" else kind), []).append((period, kind, path))
+
+    added = {}
+    for (symbol, series_interval), archives in series.items():
+        step = interval_ms(series_interval)
+        older = []
+        count = 0
+        for period, kind, path in sorted(archives):
+            chunks = (iter_agg_kline_chunks(path, series_interval) if kind == "aggTrades"
+                      else iter_kline_chunks(path))
+            for columns in chunks:
+                meta = store.meta(symbol, series_interval)
+                if meta["first_open_time"] is not None:
+                    before = columns["open_time"] < meta["first_open_time"]
+                    if before.any():
+                        older.append({name: values[before] for name, values in columns.items()})
+                    if meta["last_open_time"] is not None and columns["open_time"][-1] > meta["last_open_time"]:
+                        gap = columns["open_time"][columns["open_time"] > meta["last_open_time"]][0] - meta["last_open_time"]
+                        if gap > step:
+                            print(f"Warning: {symbol} {series_interval} has a {gap // step - 1}-candle gap "
+                                  f"before {os.path.basename(path)}.")
+                count += store.append(symbol, series_interval, columns)
+            print(f"Ingested {os.path.basename(path)}.")
+
+        if older:
+            columns = {name: np.concatenate([chunk[name] for chunk in older]) for name in COLUMNS}
+            count += store.prepend(symbol, series_interval, columns, covered_from=columns["open_time"][0])
+
+        meta = store.meta(symbol, series_interval)
+        print(f"Kline store: {count} candles added to {symbol} {series_interval} ({meta['rows']} stored).")
+        added[(symbol, series_interval)] = count
+    return added
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest Binance bulk kline/aggTrades archives into the kline store")
+    parser.add_argument("archives", nargs="+", help="downloaded .zip archives (data.binance.vision)")
+    parser.add_argument("--interval", help="kline interval to build from aggTrades archives (e.g. 1m)")
+    parser.add_argument("--store", help="kline store directory (default: $KLINE_STORE_DIR or data/klines)")
+    args = parser.parse_args()
+
+    ingest_archives(args.archives, interval=args.interval, store=KlineStore(args.store) if args.store else None)
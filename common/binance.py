@@ -0,0 +1,139 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .ratelimit import BINANCE_HOST
+from .transport import transport
+
+BASE_URL = os.environ.get("BINANCE_BASE_URL", f"https://{BINANCE_HOST}")
+KLINES_PATH = "/api/v3/klines"
+PAGE_LIMIT = 1000
+KLINES_WEIGHT = 2 # Request weight of one /api/v3/klines call
+
+# Kline interval -> length in milliseconds
+INTERVAL_MS = {
+    "1m": 60_000,
+    "3m": 3 * 60_000,
+    "5m": 5 * 60_000,
+    "15m": 15 * 60_000,
+    "30m": 30 * 60_000,
+    "1h": 3_600_000,
+    "2h": 2 * 3_600_000,
+    "4h": 4 * 3_600_000,
+    "6h": 6 * 3_600_000,
+    "8h": 8 * 3_600_000,
+    "12h": 12 * 3_600_000,
+    "1d": 86_400_000,
+}
+
+# Turkey Time (UTC+3)
+TRT_OFFSET_MS = 3 * 3_600_000
+
+# Decodable kline field -> (index in the raw Binance kline row, dtype)
+KLINE_FIELDS = {
+    "open_time": (0, np.int64),
+    "open": (1, np.float64),
+    "high": (2, np.float64),
+    "low": (3, np.float64),
+    "close": (4, np.float64),
+    "volume": (5, np.float64),
+    "close_time": (6, np.int64),
+    "quote_volume": (7, np.float64),
+    "trades": (8, np.int64),
+}
+
+
+def now_ms():
+    return transport.now_ms() # Frozen while replaying a cassette
+
+
+def interval_ms(interval):
+    if interval not in INTERVAL_MS:
+        raise ValueError(f"Unknown kline interval: {interval}")
+    return INTERVAL_MS[interval]
+
+
+def plan_windows(interval, start_ms, end_ms, limit=PAGE_LIMIT):
+    """
+    Splits [start_ms, end_ms] into page-sized (startTime, endTime) windows on
+    the candle grid, so every page can be requested independently.
+    """
+    step = interval_ms(interval)
+    first_open = -(-start_ms // step) * step # First candle opening at or after start_ms
+    span = step * limit
+    return [(t, min(t + span - 1, end_ms)) for t in range(first_open, end_ms + 1, span)]
+
+
+def _fetch_page(symbol, interval, window):
+    params = {
+        "symbol": symbol,
+        "interval": interval,
+        "limit": PAGE_LIMIT,
+        "startTime": window[0],
+        "endTime": window[1]
+    }
+    response = transport.get(BASE_URL + KLINES_PATH, weight=KLINES_WEIGHT, params=params, timeout=10)
+    data = response.json()
+    if isinstance(data, dict): # Error payload, e.g. {"code": -1121, "msg": "Invalid symbol."}
+        raise RuntimeError(f"Binance error for {symbol} {interval}: {data}")
+    return data
+
+
+def backfill_klines(symbol, interval, start_ms, end_ms=None, max_workers=8):
+    """
+    Fetches raw klines for [start_ms, end_ms] from Binance.
+    The page windows are planned up front and fetched concurrently over the
+    pooled Binance session, then copied in order into a single preallocated list.
+    Returns the rows in chronological order (the last one may still be open).
+    """
+    end_ms = end_ms or now_ms()
+    windows = plan_windows(interval, start_ms, end_ms)
+    if not windows:
+        return []
+
+    workers = max(1, min(max_workers, len(windows)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pages = list(pool.map(lambda w: _fetch_page(symbol, interval, w), windows))
+
+    # Windows do not overlap, so page order is chronological order
+    offsets = [0]
+    for page in pages:
+        offsets.append(offsets[-1] + len(page))
+    rows = [None] * offsets[-1]
+    for page, offset in zip(pages, offsets):
+        rows[offset:offset + len(page)] = page
+
+    return rows
+
+
+def decode_klines(payload, fields=("open_time", "close"), time_offset_ms=0):
+    """
+    Decodes only the requested fields of a raw kline payload into typed arrays.
+    Prices and volumes arrive as JSON strings; each field is parsed in a single
+    pass without building a table of the other columns. time_offset_ms is added
+    to open_time/close_time as plain integer arithmetic (e.g. TRT_OFFSET_MS).
+    """
+    n = len(payload)
+    columns = {}
+    for name in fields:
+        idx, dtype = KLINE_FIELDS[name]
+        values = np.fromiter((row[idx] for row in payload), dtype=dtype, count=n)
+        if time_offset_ms and name in ("open_time", "close_time"):
+            values += time_offset_ms
+        columns[name] = values
+    return columns
+
+
+def klines_frame(columns, name="USDT_Close"):
+    """
+    Builds the Turkey Time indexed close series used by the bots and research scripts.
+    QuoteVolume and Trades columns are added when the kline columns include them.
+    """
+    dates = (columns["open_time"] + TRT_OFFSET_MS).astype("datetime64[ms]")
+    frame = {name: columns["close"]}
+    for field, column in (("quote_volume", "QuoteVolume"), ("trades", "Trades")):
+        if field in columns:
+            frame[column] = columns[field]
+    return pd.DataFrame(frame, index=pd.DatetimeIndex(dates, name="Date"))
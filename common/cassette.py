@@ -0,0 +1,174 @@
+"""
+Record/replay of HTTP traffic for offline, reproducible runs.
+
+In record mode every response that goes through common.transport is appended
+to a gzipped JSON-lines cassette. In replay mode the transport answers from the
+cassette instead of the network, without rate limiting, so a whole bot or
+research run repeats instantly on exactly the recorded data.
+
+Time-dependent query parameters (Binance startTime/endTime, Yahoo
+period1/period2) differ between runs, so they are matched to the closest
+recorded value instead of exactly. Telegram bot tokens are never written.
+
+Replays are deterministic: the cassette stores when it was recorded and
+transport.now_ms() returns that instant while replaying, so fetch windows
+derived from "now" repeat exactly. While a cassette is active (either mode)
+the kline store, Trends cache and z-score state live in a fresh temporary
+directory, so what was stored by earlier runs cannot change which requests
+are made. Explicit KLINE_STORE_DIR / TRENDS_CACHE_DIR / STREAM_STATE_DIR
+settings still win.
+
+Usage:
+    HTTP_CASSETTE=run.jsonl.gz HTTP_CASSETTE_MODE=record python midnight_bot.py
+    HTTP_CASSETTE=run.jsonl.gz HTTP_CASSETTE_MODE=replay python midnight_bot.py
+"""
+import atexit
+import base64
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from requests.cookies import cookiejar_from_dict
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+MODES = ("record", "replay")
+VOLATILE_PARAMS = ("startTime", "endTime", "period1", "period2") # Derived from the current time
+DROPPED_HEADERS = ("content-encoding", "transfer-encoding", "content-length", "set-cookie") # Body is stored decoded
+SECRET_PATH = re.compile(r"/bot[^/]+/") # Telegram: /bot<token>/sendMessage
+# Persistent stores that decide which requests a run makes: env var -> subdirectory
+STORE_DIRS = {"KLINE_STORE_DIR": "klines", "TRENDS_CACHE_DIR": "trends", "STREAM_STATE_DIR": "state"}
+
+
+class CassetteMiss(LookupError):
+    pass
+
+
+def _request_key(method, url, kwargs):
+    """
+    Returns (route, stable params, volatile params, body digest) for a request
+    made with requests-style kwargs.
+    """
+    prepared = requests.Request(method.upper(), url, params=kwargs.get("params"), data=kwargs.get("data"),
+                                json=kwargs.get("json")).prepare()
+    parts = urlsplit(prepared.url)
+    route = f"{prepared.method} {parts.hostname}{SECRET_PATH.sub('/bot<token>/', parts.path)}"
+
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    stable = sorted([k, v] for k, v in query if k not in VOLATILE_PARAMS)
+    volatile = {k: v for k, v in query if k in VOLATILE_PARAMS}
+
+    body = prepared.body or b""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return route, stable, volatile, hashlib.sha1(body).hexdigest()[:16]
+
+
+def _distance(recorded, volatile):
+    if recorded.keys() != volatile.keys():
+        return float("inf")
+    try:
+        return sum(abs(float(recorded[k]) - float(volatile[k])) for k in volatile)
+    except ValueError:
+        return 0.0 if recorded == volatile else float("inf")
+
+
+class Cassette:
+    def __init__(self, path, mode):
+        if mode not in MODES:
+            raise ValueError(f"Cassette mode must be one of {MODES}, got {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.entries = {} # route -> recorded interactions, in recording order
+        self.recorded_at = None # Epoch ms the recording started
+
+        if mode == "replay":
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if "recorded_at" in entry:
+                        self.recorded_at = entry["recorded_at"]
+                        continue
+                    self.entries.setdefault(entry["route"], []).append(entry)
+            print(f"Replaying HTTP from {path} ({sum(map(len, self.entries.values()))} responses).")
+            if self.recorded_at is None:
+                print("Cassette has no recording time; replaying against the wall clock.")
+        else:
+            self.recorded_at = int(time.time() * 1000)
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with gzip.open(path, "wt", encoding="utf-8") as f: # Each recording starts a fresh cassette
+                f.write(json.dumps({"recorded_at": self.recorded_at}) + "\n")
+            print(f"Recording HTTP to {path}.")
+
+    @classmethod
+    def from_env(cls):
+        """
+        Cassette configured by $HTTP_CASSETTE / $HTTP_CASSETTE_MODE, or None.
+        """
+        path = os.environ.get("HTTP_CASSETTE")
+        if not path:
+            return None
+        cassette = cls(path, os.environ.get("HTTP_CASSETTE_MODE", "replay"))
+        cassette.isolate_stores()
+        return cassette
+
+    def isolate_stores(self):
+        """
+        Points the persistent stores at a fresh temporary directory (removed at
+        exit) unless they were configured explicitly. Must run before the store
+        modules are imported, which is why the transport creates the cassette.
+        """
+        root = tempfile.mkdtemp(prefix="cassette-")
+        atexit.register(shutil.rmtree, root, ignore_errors=True)
+        for name, subdir in STORE_DIRS.items():
+            os.environ.setdefault(name, os.path.join(root, subdir))
+
+    def record(self, method, url, response, **kwargs):
+        route, stable, volatile, body = _request_key(method, url, kwargs)
+        entry = {
+            "route": route,
+            "params": stable,
+            "volatile": volatile,
+            "body": body,
+            "status": response.status_code,
+            "headers": {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_HEADERS},
+            "cookies": response.cookies.get_dict(),
+            "content": base64.b64encode(response.content).decode("ascii"),
+        }
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self.lock:
+            with gzip.open(self.path, "at", encoding="utf-8") as f: # One gzip member per response
+                f.write(line)
+
+    def play(self, method, url, **kwargs):
+        """
+        Returns the recorded response that best matches the request: same
+        route, stable params and body, nearest time parameters.
+        """
+        route, stable, volatile, body = _request_key(method, url, kwargs)
+        candidates = [e for e in self.entries.get(route, []) if e["params"] == stable]
+        if not candidates:
+            raise CassetteMiss(f"No recorded response for {route} {stable}")
+
+        # Exact body first; a different body (e.g. a Telegram message with today's date) still replays.
+        # Among retries of the same request the successful reply wins, so replays do not re-live 429s.
+        entry = min(candidates, key=lambda e: (e["body"] != body, _distance(e["volatile"], volatile), e["status"] >= 400))
+
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.cookies = cookiejar_from_dict(entry["cookies"])
+        response._content = base64.b64decode(entry["content"])
+        response.url = url
+        response.reason = "Replayed"
+        return response
@@ -0,0 +1,145 @@
+"""
+Implied USD/TRY premium scanner across Binance TRY markets.
+
+Every configured pair yields a dollar rate in lira: directly (USDTTRY, USDCTRY)
+or crossed through USDT (BTCTRY / BTCUSDT, ...). All symbols are loaded from the
+kline store in one concurrent pass and lined up on a common candle grid as a
+symbols x time close matrix. That becomes a pairs x time premium matrix over
+Yahoo's USD/TRY, and the nightly means (00:00-09:59 TRT, as in midnight_bot) and
+rolling z-scores of every pair are computed at once.
+
+Usage:
+    python -m common.implied_fx
+    python -m common.implied_fx --pairs USDT BTC ETH --days 60
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .binance import TRT_OFFSET_MS
+from .kline_store import load_klines
+from .premium import DAY_MS, HOUR_MS, asof_join
+from .yahoo import fetch_usd_try
+
+# Pair -> (TRY market, USDT market); no USDT market = the TRY market quotes a dollar directly
+PAIRS = {
+    "USDT": ("USDTTRY", None),
+    "USDC": ("USDCTRY", None),
+    "FDUSD": ("FDUSDTRY", None),
+    "BTC": ("BTCTRY", "BTCUSDT"),
+    "ETH": ("ETHTRY", "ETHUSDT"),
+    "BNB": ("BNBTRY", "BNBUSDT"),
+    "SOL": ("SOLTRY", "SOLUSDT"),
+    "XRP": ("XRPTRY", "XRPUSDT"),
+}
+Z_WINDOW = 20
+
+
+def fetch_closes(symbols, interval="15m", days=40, offline=False, max_workers=4):
+    """
+    Loads all symbols concurrently (each synced through the kline store).
+    Returns (open_time, closes): the union of the candle open times (UTC ms)
+    and a len(symbols) x len(open_time) matrix, NaN where a symbol has no candle.
+    """
+    def load(symbol):
+        return load_klines(symbol, interval, days, columns=["open_time", "close"], offline=offline)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        series = list(pool.map(load, symbols))
+
+    open_time = np.unique(np.concatenate([s["open_time"] for s in series]))
+    closes = np.full((len(symbols), len(open_time)), np.nan)
+    for row, s in zip(closes, series):
+        row[np.searchsorted(open_time, s["open_time"])] = s["close"]
+    return open_time, closes
+
+
+def implied_rates(closes, symbols, pairs):
+    """
+    pairs x time matrix of TRY market / USDT market (or the TRY market alone).
+    """
+    row = {symbol: i for i, symbol in enumerate(symbols)}
+    ones = len(symbols) # Index of an all-ones row standing in for direct quotes
+    numerator = np.array([row[PAIRS[p][0]] for p in pairs])
+    denominator = np.array([ones if PAIRS[p][1] is None else row[PAIRS[p][1]] for p in pairs])
+    padded = np.vstack([closes, np.ones(closes.shape[1])])
+    return padded[numerator] / padded[denominator]
+
+
+def nightly_means(times_ms, premium, morning_hours=10):
+    """
+    Per-day mean of each row's non-NaN premiums over hours < morning_hours.
+    times_ms are sorted naive Turkey Time milliseconds. Returns (days, pairs x days).
+    """
+    morning = (times_ms // HOUR_MS) % 24 < morning_hours
+    t, p = times_ms[morning], premium[:, morning]
+    if len(t) == 0:
+        return pd.DatetimeIndex([]), np.empty((len(premium), 0))
+
+    day = t // DAY_MS
+    segments = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+    valid = ~np.isnan(p)
+    sums = np.add.reduceat(np.where(valid, p, 0.0), segments, axis=1)
+    counts = np.add.reduceat(valid, segments, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+    return pd.DatetimeIndex((day[segments] * DAY_MS).astype("datetime64[ms]")), means
+
+
+def scan(pairs=None, interval="15m", days=40, window=Z_WINDOW, offline=False, usd=None):
+    """
+    Returns {"premium": time x pairs, "nightly": day x pairs, "zscore": day x pairs} frames.
+    usd is a USD_Close frame in naive Turkey Time (fetched from Yahoo when None).
+    """
+    pairs = list(pairs or PAIRS)
+    symbols = sorted({symbol for p in pairs for symbol in PAIRS[p] if symbol})
+
+    print(f"Loading {len(symbols)} Binance markets for {len(pairs)} pairs...")
+    open_time, closes = fetch_closes(symbols, interval, days, offline=offline)
+    if usd is None:
+        usd = fetch_usd_try(days=days + 5)
+    if len(open_time) == 0 or usd.empty:
+        print("No kline or USD/TRY data, nothing to scan.")
+        return None
+
+    times_ms = open_time + TRT_OFFSET_MS
+    index = pd.DatetimeIndex(times_ms.astype("datetime64[ms]"), name="Date")
+    usd_at, _, _ = asof_join(index, usd.index, usd["USD_Close"])
+    premium = implied_rates(closes, symbols, pairs) / usd_at - 1
+
+    days_index, means = nightly_means(times_ms, premium)
+    nightly = pd.DataFrame(means.T, index=days_index, columns=pairs)
+    rolling = nightly.rolling(window) # All pairs at once
+    zscore = (nightly - rolling.mean()) / rolling.std()
+
+    return {"premium": pd.DataFrame(premium.T, index=index, columns=pairs), "nightly": nightly, "zscore": zscore}
+
+
+def print_scan(result):
+    nightly, zscore = result["nightly"], result["zscore"]
+    if nightly.empty:
+        print("No nightly premiums.")
+        return
+    day = nightly.index[-1]
+    print(f"\n--- IMPLIED USD/TRY PREMIUM: night of {day.date()} ---")
+    print(pd.DataFrame({
+        "Premium %": nightly.loc[day] * 100,
+        "Z-Score": zscore.loc[day],
+        "Nights": nightly.notna().sum(),
+    }).round(4).to_string())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan implied USD/TRY premia across Binance TRY markets")
+    parser.add_argument("--pairs", nargs="+", choices=list(PAIRS), help="pairs to scan (default: all)")
+    parser.add_argument("--interval", default="15m", help="kline interval (default: 15m)")
+    parser.add_argument("--days", type=int, default=40, help="history to load (default: 40)")
+    parser.add_argument("--window", type=int, default=Z_WINDOW, help="z-score window in nights (default: 20)")
+    parser.add_argument("--offline", action="store_true", help="use the kline store as-is, never contact Binance")
+    args = parser.parse_args()
+
+    result = scan(args.pairs, interval=args.interval, days=args.days, window=args.window, offline=args.offline)
+    if result is not None:
+        print_scan(result)
@@ -0,0 +1,205 @@
+"""
+Persistent on-disk kline store.
+
+Each (symbol, interval) series lives in its own directory with one raw binary
+file per column and a meta.json holding the row count, the last OpenTime and
+the earliest time the history is known to cover. Column files are append-only,
+so a daily sync only writes the new candles, and readers can memory-map them.
+"""
+import json
+import os
+
+import numpy as np
+
+from .binance import backfill_klines, decode_klines, interval_ms, now_ms
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_STORE_DIR = os.environ.get("KLINE_STORE_DIR", os.path.join(ROOT_DIR, "data", "klines"))
+
+# Stored column -> dtype (names match common.binance.KLINE_FIELDS)
+COLUMNS = {
+    "open_time": "int64",
+    "open": "float64",
+    "high": "float64",
+    "low": "float64",
+    "close": "float64",
+    "volume": "float64",
+    "quote_volume": "float64",
+    "trades": "int64",
+}
+
+
+def split_closed(rows, at_ms):
+    """
+    Splits raw kline rows into (closed, still_open) at the given time.
+    """
+    for i, row in enumerate(rows):
+        if row[6] >= at_ms: # CloseTime still in the future
+            return rows[:i], rows[i:]
+    return rows, []
+
+
+class KlineStore:
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+
+    def series_dir(self, symbol, interval):
+        return os.path.join(self.root, f"{symbol}_{interval}")
+
+    def _column_path(self, symbol, interval, name):
+        return os.path.join(self.series_dir(symbol, interval), f"{name}.bin")
+
+    def meta(self, symbol, interval):
+        path = os.path.join(self.series_dir(symbol, interval), "meta.json")
+        if not os.path.exists(path):
+            return {"rows": 0, "first_open_time": None, "last_open_time": None, "covered_from": None}
+        with open(path) as f:
+            return json.load(f)
+
+    def _save_meta(self, symbol, interval, meta):
+        path = os.path.join(self.series_dir(symbol, interval), "meta.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path) # Atomic: readers never see a half-written meta
+
+    def read(self, symbol, interval, start_ms=None, end_ms=None, columns=None, mmap=False):
+        """
+        Returns {column: array} for candles with start_ms <= OpenTime <= end_ms.
+        With mmap=True the arrays are read-only views of the column files.
+        """
+        meta = self.meta(symbol, interval)
+        names = columns or list(COLUMNS)
+        rows = meta["rows"]
+
+        if rows == 0:
+            return {name: np.empty(0, dtype=COLUMNS[name]) for name in names}
+
+        def load(name):
+            path = self._column_path(symbol, interval, name)
+            dtype = COLUMNS[name]
+            if mmap:
+                return np.memmap(path, dtype=dtype, mode="r", shape=(rows,))
+            return np.fromfile(path, dtype=dtype, count=rows)
+
+        open_time = load("open_time")
+        lo = 0 if start_ms is None else int(np.searchsorted(open_time, start_ms, side="left"))
+        hi = rows if end_ms is None else int(np.searchsorted(open_time, end_ms, side="right"))
+
+        return {name: (open_time if name == "open_time" else load(name))[lo:hi] for name in names}
+
+    def append(self, symbol, interval, columns):
+        """
+        Appends candles newer than the last stored OpenTime.
+        """
+        meta = self.meta(symbol, interval)
+        open_time = np.asarray(columns["open_time"], dtype="int64")
+        if meta["last_open_time"] is not None:
+            keep = open_time > meta["last_open_time"]
+            columns = {name: np.asarray(values)[keep] for name, values in columns.items()}
+            open_time = open_time[keep]
+        if len(open_time) == 0:
+            return 0
+
+        os.makedirs(self.series_dir(symbol, interval), exist_ok=True)
+        for name, dtype in COLUMNS.items():
+            path = self._column_path(symbol, interval, name)
+            # Drop any bytes an interrupted append left past the committed row count
+            if os.path.exists(path) and os.path.getsize(path) > meta["rows"] * np.dtype(dtype).itemsize:
+                os.truncate(path, meta["rows"] * np.dtype(dtype).itemsize)
+            with open(path, "ab") as f:
+                f.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+
+        meta["rows"] += len(open_time)
+        meta["last_open_time"] = int(open_time[-1])
+        if meta["first_open_time"] is None:
+            meta["first_open_time"] = int(open_time[0])
+        if meta["covered_from"] is None:
+            meta["covered_from"] = meta["first_open_time"]
+        self._save_meta(symbol, interval, meta)
+        return len(open_time)
+
+    def prepend(self, symbol, interval, columns, covered_from):
+        """
+        Adds candles older than the first stored OpenTime. This rewrites the
+        column files, so it should only happen when extending history backwards.
+        """
+        meta = self.meta(symbol, interval)
+        existing = self.read(symbol, interval)
+        open_time = np.asarray(columns["open_time"], dtype="int64")
+        if meta["first_open_time"] is not None:
+            keep = open_time < meta["first_open_time"]
+            columns = {name: np.asarray(values)[keep] for name, values in columns.items()}
+            open_time = open_time[keep]
+
+        os.makedirs(self.series_dir(symbol, interval), exist_ok=True)
+        for name, dtype in COLUMNS.items():
+            path = self._column_path(symbol, interval, name)
+            merged = np.concatenate([np.asarray(columns[name], dtype=dtype), existing[name]])
+            merged.tofile(path + ".tmp")
+            os.replace(path + ".tmp", path)
+
+        meta["rows"] += len(open_time)
+        if len(open_time):
+            meta["first_open_time"] = int(open_time[0])
+            if meta["last_open_time"] is None:
+                meta["last_open_time"] = int(open_time[-1])
+        meta["covered_from"] = int(covered_from)
+        self._save_meta(symbol, interval, meta)
+        return len(open_time)
+
+    def sync(self, symbol, interval, start_ms, at_ms=None):
+        """
+        Brings the store up to date so it covers [start_ms, now], fetching only
+        candles that are not stored yet. Returns the raw rows of candles that
+        are still open; those are never persisted.
+        """
+        at_ms = at_ms or now_ms()
+        step = interval_ms(interval)
+        meta = self.meta(symbol, interval)
+
+        # Extend history backwards if the caller wants more than we have
+        covered_from = meta["covered_from"]
+        if covered_from is not None and covered_from - start_ms >= step:
+            rows = backfill_klines(symbol, interval, start_ms, covered_from - 1)
+            added = self.prepend(symbol, interval, decode_klines(rows, fields=COLUMNS), start_ms)
+            print(f"Kline store: backfilled {added} older {symbol} {interval} candles.")
+            meta = self.meta(symbol, interval)
+
+        # Fetch only the delta after the last stored candle
+        was_empty = meta["last_open_time"] is None
+        tail_start = start_ms if was_empty else meta["last_open_time"] + step
+        rows = backfill_klines(symbol, interval, tail_start, at_ms)
+        closed, still_open = split_closed(rows, at_ms)
+        added = self.append(symbol, interval, decode_klines(closed, fields=COLUMNS))
+
+        meta = self.meta(symbol, interval)
+        if was_empty and added:
+            meta["covered_from"] = min(int(start_ms), meta["first_open_time"])
+            self._save_meta(symbol, interval, meta)
+        print(f"Kline store: {added} new {symbol} {interval} candles ({meta['rows']} stored).")
+
+        return still_open
+
+
+def load_klines(symbol, interval, days, columns=None, offline=False, include_open=False, store=None):
+    """
+    Returns {column: array} covering the last `days` days for symbol/interval.
+    The store is synced first unless offline=True, in which case Binance is
+    never contacted. include_open appends the in-progress candle(s).
+    """
+    store = store or KlineStore()
+    start_ms = now_ms() - days * 86_400_000
+
+    still_open = []
+    if not offline:
+        try:
+            still_open = store.sync(symbol, interval, start_ms)
+        except Exception as e:
+            print(f"Error fetching Binance data: {e}")
+
+    data = store.read(symbol, interval, start_ms=start_ms, columns=columns)
+    if include_open and still_open:
+        live = decode_klines(still_open, fields=data)
+        data = {name: np.concatenate([data[name], live[name]]) for name in data}
+    return data
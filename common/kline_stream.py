@@ -0,0 +1,75 @@
+"""
+Kline event sources for long-running bots.
+
+BinanceKlineStream follows the Binance <symbol>@kline_<interval> websocket and
+can record every message to a JSON-lines file. ReplayKlineSource plays such a
+recording back at a configurable speed, so stream consumers can be run and
+tested offline. Both yield the raw stream messages:
+    {"e": "kline", "E": <event ms>, "s": "USDTTRY", "k": {"t": ..., "c": "...", "x": <closed>, ...}}
+"""
+import json
+import time
+
+STREAM_URL = "wss://stream.binance.com:9443/ws"
+
+
+class BinanceKlineStream:
+    def __init__(self, symbol, interval, record_path=None, reconnect_delay=5):
+        self.url = f"{STREAM_URL}/{symbol.lower()}@kline_{interval}"
+        self.record_path = record_path
+        self.reconnect_delay = reconnect_delay
+
+    def __iter__(self):
+        try:
+            import websocket # websocket-client, only needed for live streaming
+        except ImportError:
+            raise ImportError("Live streaming needs the websocket-client package (pip install websocket-client).")
+
+        record = open(self.record_path, "a") if self.record_path else None
+        try:
+            while True:
+                ws = None
+                try:
+                    ws = websocket.create_connection(self.url, timeout=60)
+                    print(f"Connected to {self.url}")
+                    while True:
+                        raw = ws.recv() # Answers Binance pings for us
+                        if not raw:
+                            break
+                        if record:
+                            record.write(raw.strip() + "\n")
+                            record.flush()
+                        yield json.loads(raw)
+                except Exception as e:
+                    # Binance drops every connection after 24h; network errors end up here too
+                    print(f"Kline stream disconnected: {e}. Reconnecting in {self.reconnect_delay}s...")
+                    time.sleep(self.reconnect_delay)
+                finally:
+                    if ws is not None:
+                        ws.close()
+        finally:
+            if record:
+                record.close()
+
+
+class ReplayKlineSource:
+    def __init__(self, path, speed=1.0):
+        """
+        speed: 1.0 replays in real time, 60 runs an hour per minute,
+        0 emits every event immediately.
+        """
+        self.path = path
+        self.speed = speed
+
+    def __iter__(self):
+        previous_event = None
+        with open(self.path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                msg = json.loads(line)
+                if self.speed > 0 and previous_event is not None:
+                    time.sleep(max(msg["E"] - previous_event, 0) / 1000 / self.speed)
+                previous_event = msg["E"]
+                yield msg
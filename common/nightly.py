@@ -0,0 +1,155 @@
+"""
+Vectorized nightly-window aggregation for the Midnight research scripts.
+
+Every bar is assigned to its night (the window [date + start, date + end] of a
+BIST trading date) with one searchsorted pass, and all nights are reduced at
+once with bincount/reduceat, instead of masking the whole premium frame once
+per date. Volume-, trade- and time-weighted means come out of the same pass. BIST gap and intraday returns come from shifted arrays.
+window_cube() sweeps many (start, end) windows at once from prefix sums.
+"""
+import numpy as np
+import pandas as pd
+
+NIGHT_START = pd.Timedelta(0) # 00:00 TRT of the trading date
+NIGHT_END = pd.Timedelta(hours=9, minutes=30) # Inclusive, last bar before the open
+
+
+def _ns(index):
+    return np.asarray(pd.DatetimeIndex(index).values.astype("datetime64[ns]")).view(np.int64)
+
+
+def night_stats(index, values, dates, start=NIGHT_START, end=NIGHT_END, quote_volume=None, trades=None,
+                bar=None):
+    """
+    Per-date stats of values (bars at the sorted index) inside [date + start, date + end].
+
+    Returns a frame indexed by dates with mean, max and std (ddof=1) of the
+    non-NaN values, count (non-NaN bars) and rows (all bars, NaN included,
+    i.e. what `df[mask]` would have returned). Windows must not overlap.
+
+    Weighted means of the same bars are added on request, all from one
+    np.add.reduceat over the nights: vwap (weights quote_volume), trade_weighted
+    (weights trades) and twap (bar = bar length, e.g. "15min"; each bar counts
+    until the next one, so a missing bar's time goes to the last price seen).
+    """
+    t = _ns(index)
+    values = np.asarray(values, dtype=np.float64)
+    window_start = _ns(dates) + start.value
+    window_end = _ns(dates) + end.value
+    n = len(window_start)
+
+    # One pass: the latest window starting at or before each bar, if the bar is still inside it
+    bucket = np.searchsorted(window_start, t, side="right") - 1
+    inside = bucket >= 0
+    inside[inside] = t[inside] <= window_end[bucket[inside]]
+    bucket, x = bucket[inside], values[inside]
+
+    rows = np.bincount(bucket, minlength=n)
+    valid = ~np.isnan(x)
+    vb, vx = bucket[valid], x[valid]
+    count = np.bincount(vb, minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(vb, weights=vx, minlength=n) / count
+        squares = np.bincount(vb, weights=(vx - mean[vb]) ** 2, minlength=n) # Two-pass, like pandas
+        std = np.where(count > 1, np.sqrt(squares / (count - 1)), np.nan)
+
+    stats = {"mean": mean, "max": np.full(n, np.nan), "std": std, "count": count, "rows": rows}
+
+    weights = {}
+    if quote_volume is not None:
+        weights["vwap"] = np.asarray(quote_volume, dtype=np.float64)[inside]
+    if trades is not None:
+        weights["trade_weighted"] = np.asarray(trades, dtype=np.float64)[inside]
+    if bar is not None:
+        bar_t = t[inside]
+        held_until = np.minimum(np.r_[bar_t[1:], np.iinfo(np.int64).max], window_end[bucket] + pd.Timedelta(bar).value)
+        weights["twap"] = (held_until - bar_t).astype(np.float64)
+    for name in weights:
+        stats[name] = np.full(n, np.nan)
+
+    # Bars of one night are contiguous, so everything else reduces over segments
+    if len(bucket):
+        segments = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        nights = bucket[segments]
+        stats["max"][nights] = np.fmax.reduceat(x, segments) # fmax skips NaN
+        if weights:
+            w = np.where(valid[:, None], np.column_stack(list(weights.values())), 0.0)
+            sums = np.add.reduceat(np.hstack([w, w * np.where(valid, x, 0.0)[:, None]]), segments, axis=0)
+            k = len(weights)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                for j, name in enumerate(weights):
+                    stats[name][nights] = sums[:, k + j] / sums[:, j]
+
+    return pd.DataFrame(stats, index=pd.DatetimeIndex(dates))
+
+
+def window_slots(first="-06:00", last="09:30", step="15min"):
+    """
+    Offsets from the trading date's midnight, first..last inclusive.
+    Negative offsets reach into the previous evening ("-06:00" = 18:00 the day before).
+    """
+    def offset(text):
+        sign = -1 if text.startswith("-") else 1
+        return sign * pd.Timedelta(f"{text.lstrip('-')}:00")
+    return list(pd.timedelta_range(offset(first), offset(last), freq=step))
+
+
+def window_cube(index, values, dates, starts, ends):
+    """
+    Mean, std (ddof=1) and count of the non-NaN values in [date + start, date + end]
+    for every date x start x end, as (days, len(starts), len(ends)) arrays.
+
+    Prefix sums of the values and their squares are built once; each cell is
+    then two lookups, so a full sweep costs one pass over the bars. Cells with
+    end < start are NaN.
+    """
+    t = _ns(index)
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    # Centering keeps the sum-of-squares variance free of cancellation
+    center = values[valid].mean() if valid.any() else 0.0
+    x = np.where(valid, values - center, 0.0)
+
+    cum_count = np.r_[0, np.cumsum(valid)]
+    cum_sum = np.r_[0.0, np.cumsum(x)]
+    cum_squares = np.r_[0.0, np.cumsum(x * x)]
+
+    start_ns = np.array([pd.Timedelta(s).value for s in starts], dtype=np.int64)
+    end_ns = np.array([pd.Timedelta(e).value for e in ends], dtype=np.int64)
+    day = _ns(dates)[:, None]
+    lo = np.searchsorted(t, day + start_ns, side="left")[:, :, None]
+    hi = np.searchsorted(t, day + end_ns, side="right")[:, None, :]
+    hi = np.maximum(hi, lo) # end < start: empty window
+
+    count = cum_count[hi] - cum_count[lo]
+    total = cum_sum[hi] - cum_sum[lo]
+    squares = cum_squares[hi] - cum_squares[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        variance = np.maximum(squares - total * mean, 0.0) / (count - 1)
+        std = np.where(count > 1, np.sqrt(variance), np.nan)
+
+    ordered = start_ns[:, None] <= end_ns[None, :]
+    return {
+        "mean": np.where(ordered, mean + center, np.nan),
+        "std": np.where(ordered, std, np.nan),
+        "count": np.where(ordered, count, 0),
+    }
+
+
+def gap_returns(bist, open_col="BIST_Open", close_col="BIST_Close"):
+    """
+    (Open - previous row's Close) / previous Close; NaN on the first row.
+    """
+    close = bist[close_col].to_numpy(dtype=np.float64)
+    previous_close = np.r_[np.nan, close[:-1]]
+    return pd.Series((bist[open_col].to_numpy(dtype=np.float64) - previous_close) / previous_close,
+                     index=bist.index)
+
+
+def day_returns(bist, open_col="BIST_Open", close_col="BIST_Close"):
+    """
+    (Close - Open) / Open of each row.
+    """
+    day_open = bist[open_col].to_numpy(dtype=np.float64)
+    return pd.Series((bist[close_col].to_numpy(dtype=np.float64) - day_open) / day_open, index=bist.index)
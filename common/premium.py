@@ -0,0 +1,212 @@
+"""
+Out-of-core nightly premium over long, fine-grained kline histories.
+
+nightly_premium_chunked() computes the same daily series as
+midnight_bot.calculate_nightly_premium_history (mean USDT/USD premium over the
+00:00-09:59 TRT hours of each day) straight from column arrays, one calendar
+month at a time. Inputs can be memory-mapped column files (kline store, research
+snapshots), so only one month of each series is ever materialized; the USD
+forward-fill state is carried across chunk boundaries.
+
+asof_join()/align_premium() line USD quotes up with the (sparse) USDT bars
+directly: the latest USD quote at or before each bar, its age, and whether it
+is older than a staleness tolerance, without a dense 15-minute grid.
+
+Usage (multi-year nightly premium history from the kline store):
+    python -m common.premium --days 730 --interval 1m --output data/nightly_premium.csv
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from .binance import TRT_OFFSET_MS, interval_ms, now_ms
+from .kline_store import KlineStore
+from .yahoo import fetch_usd_try
+
+HOUR_MS = 3_600_000
+DAY_MS = 86_400_000
+USD_MAX_AGE = pd.Timedelta(hours=3) # Hourly USD/TRY quotes; older means a weekend/holiday gap
+
+
+def _ns(times):
+    return np.asarray(pd.DatetimeIndex(times).values.astype("datetime64[ns]")).view(np.int64)
+
+
+def asof_join(times, quote_times, quotes, tolerance=None):
+    """
+    For each of the sorted times, the latest non-NaN quote at or before it.
+
+    Returns (values, age, stale): values is NaN where no quote precedes the
+    time, age the quote's age as timedelta64, stale marks bars without a
+    quote or with one older than tolerance (a Timedelta; None = never stale).
+    """
+    t = _ns(times)
+    quote_t = _ns(quote_times)
+    quotes = np.asarray(quotes, dtype=np.float64)
+    valid = ~np.isnan(quotes)
+    quote_t, quotes = quote_t[valid], quotes[valid]
+
+    # Slot 0 stands for "no quote yet", so bars before the first quote need no special case
+    pos = np.searchsorted(quote_t, t, side="right")
+    found = pos > 0
+    values = np.r_[np.nan, quotes][pos]
+    age_ns = t - np.r_[0, quote_t][pos]
+    age = np.where(found, age_ns, np.iinfo(np.int64).min).view("timedelta64[ns]") # NaT without a quote
+
+    stale = ~found
+    if tolerance is not None:
+        stale |= age_ns > pd.Timedelta(tolerance).value
+    return values, age, stale
+
+
+def align_premium(usdt, usd, tolerance=None, usdt_col="USDT_Close", usd_col="USD_Close"):
+    """
+    USDT bars (all their columns) within the common time range of both series,
+    each with the as-of USD quote, Premium = USDT / USD - 1, USD_Age and Stale_USD.
+    Same premiums as reindexing both onto a dense 15-minute grid, minus the empty slots.
+    """
+    if usdt.empty or usd.empty:
+        return pd.DataFrame(columns=[usdt_col, usd_col, "Premium", "USD_Age", "Stale_USD"])
+
+    start = max(usdt.index.min(), usd.index.min())
+    end = min(usdt.index.max(), usd.index.max())
+    bars = usdt.loc[(usdt.index >= start) & (usdt.index <= end)]
+
+    values, age, stale = asof_join(bars.index, usd.index, usd[usd_col], tolerance)
+    df = bars.copy()
+    df[usd_col] = values
+    df["Premium"] = (df[usdt_col] / df[usd_col]) - 1
+    df["USD_Age"] = age
+    df["Stale_USD"] = stale
+    return df
+
+
+def _month_starts(first_ms, last_ms):
+    """
+    Millisecond starts of the calendar months spanning [first_ms, last_ms], plus the end bound.
+    """
+    months = np.arange(np.datetime64(int(first_ms), "ms").astype("datetime64[M]"),
+                       np.datetime64(int(last_ms), "ms").astype("datetime64[M]") + 2)
+    return months.astype("datetime64[ms]").astype(np.int64)
+
+
+def nightly_premium_chunked(usdt_time, usdt_close, usd_time, usd_close, step_ms=15 * 60_000,
+                            usdt_offset_ms=0, morning_hours=10):
+    """
+    Daily mean premium (USDT / USD - 1) over hours < morning_hours.
+
+    usdt_time/usd_time are sorted int64 milliseconds (naive Turkey Time after
+    adding usdt_offset_ms to the USDT times, e.g. TRT_OFFSET_MS for raw kline
+    OpenTimes); closes may be any float dtype. Matches the dense-grid
+    computation: USDT candles count only on the step_ms grid starting at the
+    first common time, USD is the last value at or before each candle.
+    """
+    if len(usdt_time) == 0 or len(usd_time) == 0:
+        return pd.Series(dtype=np.float64)
+
+    start = max(int(usdt_time[0]) + usdt_offset_ms, int(usd_time[0]))
+    end = min(int(usdt_time[-1]) + usdt_offset_ms, int(usd_time[-1]))
+
+    days, sums, counts = [], [], []
+    carry = np.nan # Last valid USD close before the current chunk
+    bounds = _month_starts(start, end)
+    for chunk_start, chunk_end in zip(bounds[:-1], bounds[1:]):
+        # Binary searches on the (memory-mapped) time columns; only this month is read
+        a = int(np.searchsorted(usdt_time, chunk_start - usdt_offset_ms, side="left"))
+        b = int(np.searchsorted(usdt_time, chunk_end - usdt_offset_ms, side="left"))
+        c = int(np.searchsorted(usd_time, chunk_start, side="left"))
+        d = int(np.searchsorted(usd_time, chunk_end, side="left"))
+
+        t = np.asarray(usdt_time[a:b], dtype=np.int64) + usdt_offset_ms
+        usdt = np.asarray(usdt_close[a:b], dtype=np.float64)
+        usd_t = np.asarray(usd_time[c:d], dtype=np.int64)
+        usd = np.asarray(usd_close[c:d], dtype=np.float64)
+        valid = ~np.isnan(usd)
+        usd_t, usd = usd_t[valid], usd[valid]
+
+        # As-of USD for every candle, falling back to the carried value before the first USD bar
+        pos = np.searchsorted(usd_t, t, side="right") - 1
+        usd_at = np.where(pos >= 0, usd[np.maximum(pos, 0)] if len(usd) else carry, carry)
+        if len(usd):
+            carry = usd[-1]
+
+        keep = ((t >= start) & (t <= end) & ((t - start) % step_ms == 0)
+                & ((t // HOUR_MS) % 24 < morning_hours))
+        premium = usdt[keep] / usd_at[keep] - 1
+        day = t[keep] // DAY_MS
+        ok = ~np.isnan(premium)
+        if not ok.any():
+            continue
+
+        chunk_days, inverse = np.unique(day[ok], return_inverse=True)
+        days.append(chunk_days)
+        sums.append(np.bincount(inverse, weights=premium[ok]))
+        counts.append(np.bincount(inverse))
+
+    if not days:
+        return pd.Series(dtype=np.float64)
+
+    # Months never split a day, so chunk results just concatenate
+    index = pd.DatetimeIndex((np.concatenate(days) * DAY_MS).astype("datetime64[ms]"))
+    return pd.Series(np.concatenate(sums) / np.concatenate(counts), index=index)
+
+
+def load_nightly_premium(usd_time, usd_close, symbol="USDTTRY", interval="1m", start_ms=None, store=None,
+                         morning_hours=10):
+    """
+    Nightly premium straight from the kline store's memory-mapped column files.
+    The store is read as-is (sync it first, e.g. with load_klines).
+    """
+    store = store or KlineStore()
+    columns = store.read(symbol, interval, start_ms=start_ms, columns=["open_time", "close"], mmap=True)
+    return nightly_premium_chunked(columns["open_time"], columns["close"], usd_time, usd_close,
+                                   step_ms=interval_ms(interval), usdt_offset_ms=TRT_OFFSET_MS,
+                                   morning_hours=morning_hours)
+
+
+def nightly_history(days=730, symbol="USDTTRY", interval="1m", offline=False, usd=None, store=None):
+    """
+    Nightly premium of the last `days` days via load_nightly_premium: the store
+    is synced (unless offline) and then read one month at a time, so the
+    history can be far larger than memory. usd is a USD_Close frame in naive
+    Turkey Time (hourly Yahoo quotes when None).
+    """
+    store = store or KlineStore()
+    start_ms = now_ms() - days * DAY_MS
+    if not offline:
+        try:
+            store.sync(symbol, interval, start_ms)
+        except Exception as e:
+            print(f"Error fetching Binance data: {e}")
+
+    if usd is None:
+        usd = fetch_usd_try(days=days + 5, interval="1h")
+    if usd.empty:
+        print("No USD/TRY data, cannot compute premiums.")
+        return pd.Series(dtype=np.float64)
+
+    usd_time = usd.index.values.astype("datetime64[ms]").astype(np.int64)
+    return load_nightly_premium(usd_time, usd["USD_Close"].to_numpy(), symbol, interval,
+                                start_ms=start_ms, store=store)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Out-of-core nightly USDT/TRY premium history")
+    parser.add_argument("--days", type=int, default=730, help="history to compute (default: 730, Yahoo's hourly limit)")
+    parser.add_argument("--symbol", default="USDTTRY", help="kline store symbol (default: USDTTRY)")
+    parser.add_argument("--interval", default="1m", help="kline interval (default: 1m)")
+    parser.add_argument("--offline", action="store_true", help="use the kline store as-is, never contact Binance")
+    parser.add_argument("--output", help="save the nightly series to this CSV")
+    args = parser.parse_args()
+
+    nightly = nightly_history(args.days, symbol=args.symbol, interval=args.interval, offline=args.offline)
+    if nightly.empty:
+        print("No nightly premiums.")
+    else:
+        nightly = nightly.rename("Premium").rename_axis("Date")
+        print(f"{len(nightly)} nights ({nightly.index[0].date()} to {nightly.index[-1].date()}).")
+        print((nightly.tail(5) * 100).to_string(float_format="%.4f"))
+        if args.output:
+            nightly.to_csv(args.output)
+            print(f"Saved to {args.output}")
@@ -0,0 +1,195 @@
+"""
+Rate-limit-aware request scheduling shared by every fetcher.
+
+Each host gets a token bucket. Buckets learn from the server: Binance's
+X-MBX-USED-WEIGHT-1M header caps the local token count, and 429/418 replies
+block the host for the Retry-After delay, given in seconds or as an HTTP date
+(or an exponential backoff with jitter when the server does not say or the
+header cannot be parsed). Code that needs to feed back failures the
+transport never saw (e.g. pytrends retries in common/trends.py) uses
+report(); everything else uses common.transport.
+"""
+import os
+import random
+import threading
+import time
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+
+
+
+def _host(env, default):
+    """
+    Host (with port, if any) of the base URL override in $env, e.g. a local
+    stand-in server (common/standin.py).
+    """
+    url = os.environ.get(env)
+    return urlparse(url).netloc if url else default
+
+
+def retry_after_seconds(value):
+    """
+    Seconds to wait from a Retry-After header, which is either a number of
+    seconds or an HTTP date. None when missing or unparseable, so the caller
+    falls back to the exponential backoff.
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None: # HTTP dates are GMT
+        when = when.replace(tzinfo=timezone.utc)
+    return max(when.timestamp() - time.time(), 0.0)
+
+
+BINANCE_HOST = _host("BINANCE_BASE_URL", "api.binance.com")
+YAHOO_HOST = _host("YAHOO_BASE_URL", "query2.finance.yahoo.com")
+TRENDS_HOST = _host("TRENDS_BASE_URL", "trends.google.com")
+TELEGRAM_HOST = _host("TELEGRAM_BASE_URL", "api.telegram.org")
+
+# Host -> bucket policy. capacity tokens refill evenly over per_seconds.
+HOST_LIMITS = {
+    # Binance allows 6000 request weight per minute per IP; keep some headroom
+    BINANCE_HOST: {"capacity": 5000, "per_seconds": 60, "used_weight_header": "X-MBX-USED-WEIGHT-1M"},
+    YAHOO_HOST: {"capacity": 30, "per_seconds": 60},
+    # Google publishes no limit; a handful of requests per minute avoids most 429s
+    TRENDS_HOST: {"capacity": 4, "per_seconds": 60},
+    TELEGRAM_HOST: {"capacity": 20, "per_seconds": 60},
+}
+DEFAULT_LIMIT = {"capacity": 10, "per_seconds": 1}
+
+THROTTLED_STATUSES = (418, 429) # 418: Binance IP ban after ignoring 429s
+
+
+class RateLimitTimeout(TimeoutError):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, capacity, per_seconds):
+        self.capacity = capacity
+        self.rate = capacity / per_seconds
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.strikes = 0 # Consecutive throttled/failed replies, drives the backoff
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, cost=1, timeout=None):
+        """
+        Waits until cost tokens are available and takes them.
+        Returns False (taking nothing) if that would take longer than timeout.
+        """
+        cost = min(cost, self.capacity) # A single call can never need more than a full bucket
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= cost:
+                    self.tokens -= cost
+                    return True
+                else:
+                    wait = (cost - self.tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def sync_used(self, used):
+        """
+        Caps local tokens by what the server says is already used this window.
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, self.capacity - used)
+
+    def throttled(self, retry_after=None):
+        """
+        Blocks the host after a throttled or failed reply.
+        """
+        with self.lock:
+            self.strikes += 1
+            if retry_after is None:
+                # Randomized Exponential Backoff: 2^n + random jitter
+                retry_after = (2 ** self.strikes) + random.randint(1, 10)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            self.tokens = 0
+
+    def succeeded(self):
+        with self.lock:
+            self.strikes = 0
+
+
+class RequestScheduler:
+    def __init__(self, limits=HOST_LIMITS):
+        self.limits = limits
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, host):
+        with self.lock:
+            if host not in self.buckets:
+                limit = self.limits.get(host, DEFAULT_LIMIT)
+                self.buckets[host] = TokenBucket(limit["capacity"], limit["per_seconds"])
+            return self.buckets[host]
+
+    def acquire(self, host, cost=1, timeout=None):
+        return self.bucket(host).acquire(cost, timeout)
+
+    def report(self, host, status=None, retry_after=None):
+        """
+        Feeds an outcome back for calls made outside request().
+        status None means the call failed without an HTTP status (e.g. timeout).
+        """
+        bucket = self.bucket(host)
+        if status is not None and status < 400:
+            bucket.succeeded()
+        elif status is None or status in THROTTLED_STATUSES or status >= 500:
+            bucket.throttled(retry_after)
+
+    def observe(self, host, response):
+        header = self.limits.get(host, {}).get("used_weight_header")
+        if header and header in response.headers:
+            self.bucket(host).sync_used(int(response.headers[header]))
+
+        if response.status_code in THROTTLED_STATUSES:
+            self.report(host, response.status_code, retry_after_seconds(response.headers.get("Retry-After")))
+        elif response.status_code < 400:
+            self.bucket(host).succeeded()
+
+    def request(self, method, url, session=None, weight=1, max_retries=5, acquire_timeout=None, **kwargs):
+        """
+        Sends a request once the host's bucket allows it, retrying 429/418
+        replies after the server-requested delay. Raises RateLimitTimeout if
+        the bucket cannot serve the request within acquire_timeout seconds.
+        """
+        host = urlparse(url).netloc
+        for attempt in range(max_retries + 1):
+            if not self.acquire(host, weight, timeout=acquire_timeout):
+                raise RateLimitTimeout(f"{host} is rate limited for longer than {acquire_timeout:.0f}s")
+            response = (session or requests).request(method, url, **kwargs)
+            self.observe(host, response)
+            response.throttle_retries = attempt
+            if response.status_code not in THROTTLED_STATUSES or attempt == max_retries:
+                return response
+            print(f"{host} throttled us ({response.status_code}), retrying...")
+        return response
+
+
+# Process-wide scheduler: all fetchers share the same per-host buckets
+scheduler = RequestScheduler()
@@ -0,0 +1,370 @@
+"""
+Local stand-in for the APIs the bots talk to, for offline load tests.
+
+Emulates Binance /api/v3/klines (pagination by startTime/endTime/limit, used
+weight header, 429 over budget), the Yahoo v8 chart API, the Google Trends
+explore/multiline endpoints used by pytrends, and Telegram sendMessage. Data is
+synthetic but deterministic. Every service can get its own latency
+distribution, error rate and 429 bursts.
+
+Each service listens on its own port so the rate limiter keeps separate
+buckets. Point the bots at it with the printed *_BASE_URL variables:
+    python -m common.standin --latency binance=lognormal:80,0.5 --burst 20,5
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .binance import INTERVAL_MS
+
+SERVICES = ("binance", "yahoo", "trends", "telegram")
+DEFAULT_PORT = 8700 # binance, yahoo, trends, telegram on consecutive ports
+BINANCE_WEIGHT_LIMIT = 6000 # Per minute, like the real API
+BASE_PRICES = {"USDTTRY": 34.6, "TRY=X": 34.4, "XU030.IS": 11_000.0}
+YAHOO_INTERVAL_S = {"1m": 60, "5m": 300, "15m": 900, "30m": 1800, "1h": 3600, "1d": 86_400}
+
+
+def parse_latency(spec):
+    """
+    Latency distribution in milliseconds -> sampler returning seconds.
+    fixed:MS, uniform:LO,HI, exp:MEAN, lognormal:MEDIAN,SIGMA
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",")] if args else []
+    if kind == "fixed":
+        return lambda rng: values[0] / 1000
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1 / values[0]) / 1000
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1]) / 1000
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class Faults:
+    def __init__(self, latency="fixed:0", error_rate=0.0, burst_every=0, burst_length=0, retry_after=5, seed=None):
+        """
+        burst_every/burst_length: of every burst_every requests, the last
+        burst_length are answered with 429 and Retry-After: retry_after.
+        """
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.stats = {"requests": 0, "throttled": 0, "errors": 0}
+
+    def draw(self):
+        """
+        Returns (delay_seconds, forced status or None) for the next request.
+        """
+        with self.lock:
+            n = self.requests
+            self.requests += 1
+            self.stats["requests"] += 1
+            delay = self.latency(self.rng)
+            if self.burst_every and n % self.burst_every >= self.burst_every - self.burst_length:
+                self.stats["throttled"] += 1
+                return delay, 429
+            if self.rng.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return delay, 503
+            return delay, None
+
+
+def _noise(key, t):
+    return zlib.crc32(f"{key}:{t}".encode()) / 0xFFFFFFFF - 0.5
+
+
+def synthetic_price(symbol, t_s):
+    """
+    Deterministic price: slow drift, a daily cycle and per-bar noise.
+    """
+    base = BASE_PRICES.get(symbol, 100.0)
+    drift = 0.03 * math.sin(2 * math.pi * t_s / (45 * 86_400))
+    daily = 0.003 * math.sin(2 * math.pi * t_s / 86_400)
+    return base * (1 + drift + daily + 0.002 * _noise(symbol, int(t_s)))
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    service = None # Set per server
+    faults = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        if not isinstance(body, (bytes, str)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        parts = urlsplit(self.path)
+        self.route = parts.path
+        self.params = {k: v[-1] for k, v in parse_qs(parts.query, keep_blank_values=True).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        self.body = self.rfile.read(length) if length else b""
+
+        delay, forced = self.faults.draw()
+        time.sleep(delay)
+        if forced == 429:
+            retry_after = str(self.faults.retry_after)
+            return self._send(429, {"error": "Too many requests"}, headers={"Retry-After": retry_after})
+        if forced == 503:
+            return self._send(503, {"error": "Service unavailable (injected)"})
+
+        getattr(self, f"serve_{self.service}")()
+
+    do_GET = _handle
+    do_POST = _handle
+
+    # --- Binance ---
+    weight_lock = threading.Lock()
+    weight_minute = 0
+    weight_used = 0
+
+    def _binance_weight(self, weight):
+        with StandinHandler.weight_lock:
+            minute = int(time.time() // 60)
+            if minute != StandinHandler.weight_minute:
+                StandinHandler.weight_minute, StandinHandler.weight_used = minute, 0
+            StandinHandler.weight_used += weight
+            return StandinHandler.weight_used
+
+    def serve_binance(self):
+        if self.route != "/api/v3/klines":
+            return self._send(404, {"code": -1000, "msg": "Unknown endpoint."})
+
+        used = self._binance_weight(2)
+        weight_header = {"X-MBX-USED-WEIGHT-1M": str(used)}
+        if used > BINANCE_WEIGHT_LIMIT:
+            weight_header["Retry-After"] = str(60 - int(time.time()) % 60)
+            return self._send(429, {"code": -1003, "msg": "Too many requests."}, headers=weight_header)
+
+        symbol, interval = self.params.get("symbol"), self.params.get("interval")
+        if not symbol:
+            return self._send(400, {"code": -1102, "msg": "Mandatory parameter 'symbol' was not sent."})
+        if interval not in INTERVAL_MS:
+            return self._send(400, {"code": -1120, "msg": "Invalid interval."})
+
+        step = INTERVAL_MS[interval]
+        limit = min(int(self.params.get("limit", 500)), 1000)
+        now = int(time.time() * 1000)
+        last_open = now // step * step # The still-open candle is included, as on Binance
+        if "endTime" in self.params:
+            last_open = min(last_open, int(self.params["endTime"]) // step * step)
+        if "startTime" in self.params:
+            first_open = -(-int(self.params["startTime"]) // step) * step
+        else:
+            first_open = last_open - (limit - 1) * step
+        opens = range(first_open, min(last_open, first_open + (limit - 1) * step) + 1, step)
+
+        rows = []
+        for t in opens:
+            o = synthetic_price(symbol, t / 1000)
+            c = synthetic_price(symbol, (t + step) / 1000)
+            spread = abs(_noise(symbol + "hl", t)) * 0.002 * o
+            volume = 1_000 + 5_000 * (_noise(symbol + "v", t) + 0.5)
+            trades = int(50 + 400 * (_noise(symbol + "n", t) + 0.5))
+            rows.append([t, f"{o:.8f}", f"{max(o, c) + spread:.8f}", f"{min(o, c) - spread:.8f}", f"{c:.8f}",
+                         f"{volume:.8f}", t + step - 1, f"{volume * c:.8f}", trades,
+                         f"{volume / 2:.8f}", f"{volume * c / 2:.8f}", "0"])
+        self._send(200, rows, headers=weight_header)
+
+    # --- Yahoo ---
+    def serve_yahoo(self):
+        symbol = self.route.rsplit("/", 1)[-1]
+        if not self.route.startswith("/v8/finance/chart/") or symbol not in BASE_PRICES:
+            return self._send(404, {"chart": {"result": None, "error": {
+                "code": "Not Found", "description": "No data found, symbol may be delisted"}}})
+
+        interval = self.params.get("interval", "1d")
+        step = YAHOO_INTERVAL_S.get(interval)
+        if step is None:
+            return self._send(422, {"chart": {"result": None, "error": {
+                "code": "Unprocessable Entity", "description": f"Invalid input - interval={interval} is not supported"}}})
+
+        end = min(int(self.params.get("period2", time.time())), int(time.time()))
+        start = int(self.params.get("period1", end - 30 * 86_400))
+        offset = 7 * 3600 if step == 86_400 else 0 # Daily bars stamped at the Istanbul open
+        timestamps = [t + offset for t in range(-(-start // step) * step, end + 1, step)
+                      if datetime.fromtimestamp(t, timezone.utc).weekday() < 5]
+
+        closes = [synthetic_price(symbol, t + step) for t in timestamps]
+        opens = [synthetic_price(symbol, t) for t in timestamps]
+        result = {
+            "meta": {"symbol": symbol, "currency": "TRY", "dataGranularity": interval,
+                     "exchangeTimezoneName": "Europe/Istanbul" if symbol.endswith(".IS") else "Europe/London",
+                     "regularMarketPrice": closes[-1] if closes else None},
+            "timestamp": timestamps,
+            "indicators": {"quote": [{
+                "open": opens,
+                "high": [max(o, c) * 1.001 for o, c in zip(opens, closes)],
+                "low": [min(o, c) * 0.999 for o, c in zip(opens, closes)],
+                "close": closes,
+                "volume": [0 if symbol.endswith("=X") else int(1e6 * (_noise(symbol, t) + 1)) for t in timestamps],
+            }]},
+        }
+        self._send(200, {"chart": {"result": [result], "error": None}})
+
+    # --- Google Trends ---
+    def serve_trends(self):
+        if self.route.rstrip("/") == "/trends/explore":
+            return self._send(200, "<html></html>", "text/html", {"Set-Cookie": "NID=standin; Path=/"})
+
+        if self.route == "/trends/api/explore":
+            req = json.loads(self.params.get("req", "{}"))
+            items = req.get("comparisonItem", [])
+            request = {
+                "time": items[0]["time"] if items else "today 3-m",
+                "keywords": [item["keyword"] for item in items],
+                "geo": items[0].get("geo", "") if items else "",
+            }
+            token = hashlib.sha1(json.dumps(request).encode()).hexdigest()[:20]
+            widgets = {"widgets": [{"id": "TIMESERIES", "token": token, "request": request}]}
+            return self._send(200, ")]}'" + json.dumps(widgets), "application/json")
+
+        if self.route == "/trends/api/widgetdata/multiline":
+            request = json.loads(self.params.get("req", "{}"))
+            return self._send(200, ")]}'," + json.dumps(self._timeline(request)), "application/json")
+
+        self._send(404, "Not Found", "text/html")
+
+    def _timeline(self, request):
+        timeframe = request.get("time", "today 3-m")
+        end = int(time.time()) // 86_400 * 86_400
+        if timeframe.startswith("today"):
+            amount, unit = timeframe.split()[1].split("-")
+            start = end - int(amount) * {"m": 30, "y": 365}[unit] * 86_400
+        else:
+            first, last = timeframe.split()
+            start = int(datetime.strptime(first, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+            end = int(datetime.strptime(last, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+        step = 86_400 if end - start <= 270 * 86_400 else 7 * 86_400 # Google switches to weekly points
+
+        keywords = request.get("keywords", [])
+        times = list(range(start, end + 1, step))
+        raw = [[max(1 + 50 * (1 + math.sin(t / (9 * 86_400) + i)) * (1 + _noise(kw, t)), 0) for t in times]
+               for i, kw in enumerate(keywords)]
+        peak = max((max(series) for series in raw if series), default=1)
+
+        points = []
+        for j, t in enumerate(times):
+            values = [int(round(100 * series[j] / peak)) for series in raw]
+            point = {"time": str(t), "formattedTime": datetime.fromtimestamp(t, timezone.utc).strftime("%b %d, %Y"),
+                     "value": values, "hasData": [v > 0 for v in values]}
+            if j == len(times) - 1:
+                point["isPartial"] = True
+            points.append(point)
+        return {"default": {"timelineData": points, "averages": []}}
+
+    # --- Telegram ---
+    message_id = 0
+
+    def serve_telegram(self):
+        if not self.route.endswith("/sendMessage"):
+            return self._send(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+        try:
+            payload = json.loads(self.body or b"{}")
+        except ValueError:
+            payload = {}
+        if not payload.get("chat_id"):
+            return self._send(400, {"ok": False, "error_code": 400, "description": "Bad Request: chat_id is empty"})
+
+        StandinHandler.message_id += 1
+        print(f"[telegram] message {StandinHandler.message_id} to {payload['chat_id']}:\n{payload.get('text', '')}")
+        self._send(200, {"ok": True, "result": {"message_id": StandinHandler.message_id,
+                                                "chat": {"id": payload["chat_id"]},
+                                                "date": int(time.time()), "text": payload.get("text", "")}})
+
+
+def start_servers(port=DEFAULT_PORT, faults=None, host="127.0.0.1"):
+    """
+    Starts one threaded server per service in the background.
+    port 0 picks free ports. Returns {service: (server, base_url)}.
+    """
+    faults = faults or {}
+    servers = {}
+    for i, service in enumerate(SERVICES):
+        handler = type(f"{service.capitalize()}Handler", (StandinHandler,),
+                       {"service": service, "faults": faults.get(service) or Faults()})
+        server = ThreadingHTTPServer((host, port + i if port else 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        base_url = f"http://{host}:{server.server_address[1]}"
+        if service == "trends":
+            base_url += "/trends"
+        servers[service] = (server, base_url)
+    return servers
+
+
+def _per_service(values, cast):
+    """
+    ["0.1", "yahoo=0.3"] -> {service: value}; unprefixed values apply to every service.
+    """
+    result = {}
+    for value in values or []:
+        service, sep, rest = value.partition("=")
+        if sep and service in SERVICES:
+            result[service] = cast(rest)
+        else:
+            result.update({s: cast(value) for s in SERVICES if s not in result})
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for Binance, Yahoo, Google Trends and Telegram")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="first port (services use 4 consecutive ports)")
+    parser.add_argument("--latency", action="append", metavar="[SERVICE=]DIST",
+                        help="fixed:MS, uniform:LO,HI, exp:MEAN or lognormal:MEDIAN,SIGMA (ms)")
+    parser.add_argument("--error-rate", action="append", metavar="[SERVICE=]P", help="fraction of 503 replies")
+    parser.add_argument("--burst", action="append", metavar="[SERVICE=]EVERY,LENGTH",
+                        help="answer the last LENGTH of every EVERY requests with 429")
+    parser.add_argument("--retry-after", type=int, default=5, help="Retry-After seconds sent with injected 429s")
+    parser.add_argument("--seed", type=int, help="seed for latency and error sampling")
+    args = parser.parse_args()
+
+    latency = _per_service(args.latency, str)
+    error_rate = _per_service(args.error_rate, float)
+    burst = _per_service(args.burst, lambda v: tuple(int(x) for x in v.split(",")))
+    faults = {
+        service: Faults(latency=latency.get(service, "fixed:0"), error_rate=error_rate.get(service, 0.0),
+                        burst_every=burst.get(service, (0, 0))[0], burst_length=burst.get(service, (0, 0))[1],
+                        retry_after=args.retry_after, seed=args.seed)
+        for service in SERVICES
+    }
+
+    servers = start_servers(args.port, faults)
+    print("Stand-in servers running. Point the bots at them with:")
+    for service, (_, base_url) in servers.items():
+        print(f"export {service.upper()}_BASE_URL={base_url}")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\n--- STAND-IN SUMMARY ---")
+        for service in SERVICES:
+            stats = faults[service].stats
+            print(f"{service}: {stats['requests']} req, {stats['throttled']} injected 429, {stats['errors']} injected 503")
@@ -0,0 +1,227 @@
+"""
+Persisted streaming z-score state for the bots.
+
+A bot's daily observations only matter through the last `window` of them, so
+instead of refetching the whole lookback every run the state keeps a ring
+buffer of the finalized days and their running sums in a small JSON file
+(data/state/<name>.json). A run pushes the days added since the last one in
+O(1) each and scores the newest observation against the window, so its compute
+and data needs no longer depend on the window length. A state that is missing
+or fails its consistency check is discarded and the bot falls back to a full
+refetch.
+"""
+import json
+import math
+import os
+from collections import deque
+
+import pandas as pd
+
+from .kline_store import ROOT_DIR
+
+DEFAULT_STATE_DIR = os.environ.get("STREAM_STATE_DIR", os.path.join(ROOT_DIR, "data", "state"))
+STATE_VERSION = 1
+SUM_TOLERANCE = 1e-9 # Relative drift allowed between the stored and re-summed window
+
+
+def state_path(name, root=DEFAULT_STATE_DIR):
+    return os.path.join(root, f"{name}.json")
+
+
+class RollingWindow:
+    """
+    Mean and sample std (ddof=1) of the last `size` values.
+
+    Sums are kept relative to a fixed shift (the first value seen) so the
+    variance does not cancel out when the mean dwarfs the spread, and are
+    re-summed from the window once every `size` pushes so rounding errors
+    cannot accumulate: still O(1) per push, amortized.
+    """
+    def __init__(self, size, values=()):
+        self.size = size
+        self.shift = None
+        self.values = deque(maxlen=size)
+        self.total = 0.0
+        self.squares = 0.0
+        self.pushes = 0
+        for value in values:
+            self.push(value)
+
+    def push(self, value):
+        value = float(value)
+        if self.shift is None:
+            self.shift = value
+        if len(self.values) == self.size:
+            old = self.values[0] - self.shift
+            self.total -= old
+            self.squares -= old * old
+        self.values.append(value)
+        x = value - self.shift
+        self.total += x
+        self.squares += x * x
+
+        self.pushes += 1
+        if self.pushes % self.size == 0:
+            self.total, self.squares = self._resum()
+
+    def _resum(self):
+        return (math.fsum(v - self.shift for v in self.values),
+                math.fsum((v - self.shift) ** 2 for v in self.values))
+
+    def consistent(self):
+        """
+        Whether the running sums still match the buffered values.
+        """
+        if not self.values:
+            return self.total == 0.0 and self.squares == 0.0
+        total, squares = self._resum()
+        scale = max(squares, 1.0)
+        return abs(total - self.total) <= SUM_TOLERANCE * scale and abs(squares - self.squares) <= SUM_TOLERANCE * scale
+
+    @staticmethod
+    def _stats(n, total, squares, shift):
+        if n == 0:
+            return math.nan, math.nan
+        mean = total / n
+        if n < 2:
+            return mean + shift, math.nan
+        return mean + shift, math.sqrt(max(squares - total * mean, 0.0) / (n - 1))
+
+    def stats(self):
+        """
+        (mean, std) of the window; std is NaN below two values.
+        """
+        return self._stats(len(self.values), self.total, self.squares, self.shift)
+
+    def preview(self, *values):
+        """
+        (mean, std) the window would have after pushing values, without changing it.
+        """
+        values = [float(v) for v in values]
+        if not values:
+            return self.stats()
+        shift = values[0] if self.shift is None else self.shift
+        total, squares, n = self.total, self.squares, len(self.values)
+        buffered = len(self.values)
+        for i, value in enumerate(values):
+            if n == self.size: # Drop the oldest value still in the would-be window
+                dropped = i - (self.size - buffered)
+                old = (self.values[dropped] if dropped < buffered else values[dropped - buffered]) - shift
+                total -= old
+                squares -= old * old
+            else:
+                n += 1
+            x = value - shift
+            total += x
+            squares += x * x
+        return self._stats(n, total, squares, shift)
+
+    def __len__(self):
+        return len(self.values)
+
+
+class WindowState:
+    """
+    The finalized daily observations (date -> value) of the last `window` days
+    plus their RollingWindow, loaded from and saved to a JSON file.
+    """
+    def __init__(self, window, path):
+        self.path = path
+        self.days = deque(maxlen=window)
+        self.rolling = RollingWindow(window)
+
+    def __len__(self):
+        return len(self.days)
+
+    @property
+    def last_day(self):
+        return self.days[-1] if self.days else None
+
+    def series(self):
+        """
+        The buffered days as a date-indexed Series.
+        """
+        return pd.Series(list(self.rolling.values), index=pd.DatetimeIndex(list(self.days)), dtype=float)
+
+    def problem(self):
+        """
+        Why the state cannot be trusted, or None.
+        """
+        if len(self.days) != len(self.rolling.values):
+            return f"{len(self.days)} days for {len(self.rolling.values)} values"
+        if any(later <= earlier for earlier, later in zip(list(self.days), list(self.days)[1:])):
+            return "days out of order"
+        if any(math.isnan(v) or math.isinf(v) for v in self.rolling.values):
+            return "non-finite values"
+        if not self.rolling.consistent():
+            return "running sums do not match the buffered values"
+        return None
+
+    @classmethod
+    def load(cls, window, path):
+        """
+        The saved state, or an empty one if the file is missing, unreadable,
+        was built for another window size or fails the consistency check.
+        """
+        state = cls(window, path)
+        if not os.path.exists(path):
+            return state
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+            if saved.get("version") != STATE_VERSION or saved.get("window") != window:
+                return state
+
+            loaded = cls(window, path)
+            rolling = loaded.rolling
+            loaded.days.extend(pd.Timestamp(day) for day in saved["days"])
+            rolling.values.extend(float(v) for v in saved["values"])
+            rolling.shift, rolling.total, rolling.squares, rolling.pushes = (
+                saved["shift"], saved["total"], saved["squares"], saved["pushes"])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring unreadable state {path}: {e}")
+            return state
+
+        problem = loaded.problem()
+        if problem:
+            print(f"Ignoring inconsistent state {path}: {problem}.")
+            return state
+        return loaded
+
+    def save(self):
+        rolling = self.rolling
+        saved = {
+            "version": STATE_VERSION,
+            "window": rolling.size,
+            "days": [day.strftime("%Y-%m-%d") for day in self.days],
+            "values": list(rolling.values),
+            "shift": rolling.shift,
+            "total": rolling.total,
+            "squares": rolling.squares,
+            "pushes": rolling.pushes,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(saved, f)
+        os.replace(tmp_path, self.path) # Atomic: a crash never leaves a half-written state
+
+    def finalize(self, series):
+        """
+        Pushes the days of series (date-indexed) newer than the last finalized
+        day, in order. Returns how many were added.
+        """
+        added = 0
+        for day, value in series.items():
+            if self.last_day is not None and day <= self.last_day:
+                continue
+            self.days.append(day)
+            self.rolling.push(value)
+            added += 1
+        return added
+
+    def score(self, *values):
+        """
+        (mean, std) of the window with values as its newest (not yet final) days.
+        """
+        return self.rolling.preview(*values)
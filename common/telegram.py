@@ -0,0 +1,35 @@
+"""
+Telegram alerts over the shared transport.
+"""
+import os
+
+from .ratelimit import TELEGRAM_HOST
+from .transport import transport
+
+BASE_URL = os.environ.get("TELEGRAM_BASE_URL", f"https://{TELEGRAM_HOST}")
+
+
+def send_telegram_alert(message):
+    token = os.environ.get("TELEGRAM_BOT_TOKEN")
+    chat_id = os.environ.get("TELEGRAM_CHAT_ID")
+    
+    if not token or not chat_id:
+        print("Error: Telegram credentials not found in environment variables.")
+        return False
+        
+    url = f"{BASE_URL}/bot{token}/sendMessage"
+    payload = {
+        "chat_id": chat_id,
+        "text": message,
+        "parse_mode": "Markdown"
+    }
+    
+    try:
+        response = transport.post(url, json=payload, timeout=10)
+        if response.status_code == 200:
+            print("Telegram alert sent successfully.")
+            return True
+        print(f"Error sending Telegram alert: {response.text}")
+    except Exception as e:
+        print(f"Error sending Telegram alert: {e}")
+    return False
@@ -0,0 +1,140 @@
+"""
+Pooled HTTP transport for every outbound call.
+
+One keep-alive requests.Session per host (so repeated calls skip the TCP+TLS
+handshake), one retry policy for connection errors and 5xx replies, rate
+limiting through common.ratelimit, and a timing record for every request:
+latency, response bytes and retries. With $HTTP_CASSETTE set, responses are
+recorded to or replayed from a cassette (see common.cassette).
+"""
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .cassette import Cassette
+from .ratelimit import scheduler
+
+# 429/418 are not retried here: the scheduler owns throttling (Retry-After, backoff).
+# urllib3 would otherwise retry any 429/503 carrying Retry-After and sleep it out itself.
+RETRY_POLICY = Retry(
+    total=3,
+    backoff_factor=0.5,
+    status_forcelist=[500, 502, 503, 504],
+    allowed_methods=["GET", "POST"],
+    respect_retry_after_header=False,
+    raise_on_status=False
+)
+POOL_MAXSIZE = 16 # Keep-alive connections per host (concurrent backfills use up to 8)
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+
+
+@dataclass
+class RequestRecord:
+    host: str
+    method: str
+    path: str
+    status: int
+    latency: float # Seconds, including rate-limit waits
+    bytes: int
+    retries: int
+
+
+class Transport:
+    def __init__(self, scheduler=scheduler, max_records=10_000, cassette=None):
+        self.scheduler = scheduler
+        self.cassette = cassette
+        self.sessions = {}
+        self.records = deque(maxlen=max_records)
+        self.lock = threading.Lock()
+
+    def session(self, host):
+        with self.lock:
+            if host not in self.sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(max_retries=RETRY_POLICY, pool_connections=1, pool_maxsize=POOL_MAXSIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers["User-Agent"] = USER_AGENT
+                self.sessions[host] = session
+            return self.sessions[host]
+
+    def request(self, method, url, weight=1, max_retries=5, acquire_timeout=None, **kwargs):
+        """
+        Sends a request over the host's pooled session, via the rate-limit scheduler.
+        Replay cassettes answer immediately, without touching the network.
+        """
+        host = urlparse(url).netloc
+        started = time.perf_counter()
+        if self.cassette and self.cassette.mode == "replay":
+            response = self.cassette.play(method, url, **kwargs)
+        else:
+            response = self.scheduler.request(method, url, session=self.session(host), weight=weight,
+                                              max_retries=max_retries, acquire_timeout=acquire_timeout, **kwargs)
+            if self.cassette:
+                self.cassette.record(method, url, response, **kwargs)
+
+        retries = getattr(response, "throttle_retries", 0)
+        urllib3_retries = getattr(response.raw, "retries", None)
+        if urllib3_retries is not None:
+            retries += len(urllib3_retries.history)
+        self.records.append(RequestRecord(
+            host=host,
+            method=method.upper(),
+            path=urlparse(url).path,
+            status=response.status_code,
+            latency=time.perf_counter() - started,
+            bytes=len(response.content),
+            retries=retries
+        ))
+        return response
+
+    def now_ms(self):
+        """
+        Epoch milliseconds; the recording time while replaying a cassette, so
+        every fetch window derived from "now" matches the recorded run.
+        """
+        if self.cassette and self.cassette.mode == "replay" and self.cassette.recorded_at is not None:
+            return self.cassette.recorded_at
+        return int(time.time() * 1000)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def summary(self):
+        """
+        Per-host totals: requests, errors, retries, bytes, mean and max latency.
+        """
+        hosts = {}
+        for record in list(self.records):
+            stats = hosts.setdefault(record.host, {"requests": 0, "errors": 0, "retries": 0, "bytes": 0,
+                                                   "latency_total": 0.0, "latency_max": 0.0})
+            stats["requests"] += 1
+            stats["errors"] += record.status >= 400
+            stats["retries"] += record.retries
+            stats["bytes"] += record.bytes
+            stats["latency_total"] += record.latency
+            stats["latency_max"] = max(stats["latency_max"], record.latency)
+        return hosts
+
+    def print_summary(self):
+        hosts = self.summary()
+        if not hosts:
+            return
+        print("--- HTTP SUMMARY ---")
+        for host, stats in hosts.items():
+            mean = stats["latency_total"] / stats["requests"]
+            print(f"{host}: {stats['requests']} req, {stats['errors']} err, {stats['retries']} retries, "
+                  f"{stats['bytes'] / 1024:.1f} KiB, latency mean {mean * 1000:.0f} ms / max {stats['latency_max'] * 1000:.0f} ms")
+
+
+# Process-wide transport: sessions, records and the cassette are shared by all fetchers
+transport = Transport(cassette=Cassette.from_env())
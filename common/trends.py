@@ -0,0 +1,314 @@
+"""
+Google Trends access with a persistent cache.
+
+interest_over_time() results are cached on disk keyed by (keywords, timeframe,
+geo, hl). A cached series younger than the TTL is used as-is; otherwise a live
+fetch is attempted until the deadline, and if it never succeeds the last good
+series is returned and flagged as stale. Every write prunes entries not
+rewritten for MAX_AGE (dated incremental timeframes add a new key each day);
+settled history windows live in history/ and are kept for good.
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from pytrends import exceptions
+from pytrends.request import BASE_TRENDS_URL, TrendReq
+
+from .ratelimit import TRENDS_HOST, RateLimitTimeout, scheduler
+from .transport import transport
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_DIR = os.environ.get("TRENDS_CACHE_DIR", os.path.join(ROOT_DIR, "data", "trends"))
+DEFAULT_TTL = 6 * 3600 # Seconds a cached series counts as fresh
+MAX_AGE = 7 * 86400 # Seconds an entry is kept as a stale fallback after its last write
+SETTLE_DAYS = 3 # Trends keeps revising the most recent days; older ones never change
+TRENDS_BASE_URL = os.environ.get("TRENDS_BASE_URL", BASE_TRENDS_URL)
+
+
+class TransportTrendReq(TrendReq):
+    """
+    TrendReq that sends its requests over the shared transport (pooled session,
+    rate limiting, timing). Throttled replies are not retried here; they raise
+    TooManyRequestsError after the scheduler has blocked the host.
+    """
+    def __init__(self, *args, acquire_timeout=None, **kwargs):
+        self.acquire_timeout = acquire_timeout # Seconds a request may wait for the Trends bucket
+        super().__init__(*args, **kwargs)
+
+    def GetGoogleCookie(self):
+        response = transport.get(f"{TRENDS_BASE_URL}/explore/?geo={self.hl[-2:]}", max_retries=0,
+                                 acquire_timeout=self.acquire_timeout, timeout=self.timeout, **self.requests_args)
+        return {name: value for name, value in response.cookies.items() if name == "NID"}
+
+    def _get_data(self, url, method=TrendReq.GET_METHOD, trim_chars=0, **kwargs):
+        url = TRENDS_BASE_URL + url[len(BASE_TRENDS_URL):] # pytrends hardcodes the Google URLs
+        response = transport.request(method.upper(), url, max_retries=0, acquire_timeout=self.acquire_timeout,
+                                     timeout=self.timeout, cookies=self.cookies, headers=self.headers,
+                                     **kwargs, **self.requests_args)
+        content_type = response.headers.get("Content-Type", "")
+        if response.status_code == 200 and any(
+                kind in content_type for kind in ("application/json", "application/javascript", "text/javascript")):
+            # Responses start with garbage like ")]}'," that has to go before parsing
+            return json.loads(response.text[trim_chars:])
+        if response.status_code == 429:
+            raise exceptions.TooManyRequestsError.from_response(response)
+        raise exceptions.ResponseError.from_response(response)
+
+
+class TrendsCache:
+    def __init__(self, root=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, max_age=MAX_AGE):
+        self.root = root
+        self.ttl = ttl
+        self.max_age = max_age # None keeps every entry
+
+    def path(self, keywords, timeframe, geo, hl):
+        key = json.dumps([list(keywords), timeframe, geo, hl], ensure_ascii=False)
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.root, f"{digest}.csv")
+
+    def get(self, keywords, timeframe, geo, hl):
+        """
+        Returns (df, age_seconds), or (None, None) if nothing is cached.
+        """
+        path = self.path(keywords, timeframe, geo, hl)
+        if not os.path.exists(path):
+            return None, None
+        df = pd.read_csv(path, index_col=0, parse_dates=True)
+        return df, time.time() - os.path.getmtime(path)
+
+    def put(self, keywords, timeframe, geo, hl, df):
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(keywords, timeframe, geo, hl)
+        df.to_csv(path + ".tmp")
+        os.replace(path + ".tmp", path)
+        self.prune()
+
+    def prune(self):
+        """
+        Deletes entries (and leftover .tmp files) not written for max_age seconds.
+        """
+        if self.max_age is None:
+            return
+        cutoff = time.time() - self.max_age
+        for entry in os.scandir(self.root):
+            if entry.is_file() and entry.name.endswith((".csv", ".tmp")):
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                except FileNotFoundError: # A concurrent writer got there first
+                    pass
+
+
+def fetch_interest_over_time(keywords, timeframe="today 3-m", geo="TR", hl="tr-TR", tz=180,
+                             deadline=180, cache=None):
+    """
+    Fetches interest_over_time() for keywords, spending at most `deadline`
+    seconds on live attempts (a single in-flight attempt can still run up to
+    its request timeout).
+
+    Returns (df, stale_age): stale_age is None when the data is live or a fresh
+    cache hit, otherwise the age in seconds of the cached series that was used.
+    Raises the last fetch error when there is neither live nor cached data.
+    """
+    cache = cache or TrendsCache()
+    cached, age = cache.get(keywords, timeframe, geo, hl)
+    if cached is not None and age < cache.ttl:
+        print(f"Using cached Trends data ({age / 60:.0f} min old).")
+        return cached, None
+
+    started = time.monotonic()
+    pytrends = None
+    last_error = None
+    attempt = 0
+
+    while True:
+        # Backoff after 429s lives in the shared scheduler; requests that would
+        # have to wait past the deadline raise RateLimitTimeout instead
+        remaining = deadline - (time.monotonic() - started)
+        if remaining <= 0:
+            break
+        try:
+            if pytrends is None: # The constructor already talks to Google (cookie fetch)
+                pytrends = TransportTrendReq(hl=hl, tz=tz, requests_args={'verify': True}, timeout=(10, 25),
+                                             acquire_timeout=remaining)
+            pytrends.acquire_timeout = remaining
+            pytrends.build_payload(list(keywords), cat=0, timeframe=timeframe, geo=geo, gprop='')
+            df = pytrends.interest_over_time()
+            if not df.empty:
+                cache.put(keywords, timeframe, geo, hl, df)
+                return df, None
+            last_error = ValueError("Google Trends returned no data.")
+        except RateLimitTimeout as e:
+            last_error = e
+            break
+        except Exception as e:
+            last_error = e
+            attempt += 1
+            print(f"Attempt {attempt} failed: {e}")
+            if getattr(e, "response", None) is None: # No HTTP reply (timeout, DNS...): back off too
+                scheduler.report(TRENDS_HOST)
+            elif e.response.status_code >= 500:
+                scheduler.report(TRENDS_HOST, e.response.status_code)
+
+    if cached is not None:
+        print(f"Live fetch missed its {deadline}s deadline; using cached data ({age / 3600:.1f} h old).")
+        return cached, age
+    raise last_error or TimeoutError(f"No Trends request fitted in the {deadline}s deadline.")
+
+
+def plan_batches(keywords, anchor, batch_size=5):
+    """
+    Packs the keywords other than the anchor into groups of batch_size - 1.
+    Each group is fetched with one bridge term already on the common scale
+    (the anchor for the first group), filling the Trends payload.
+    """
+    others = [kw for kw in dict.fromkeys(keywords) if kw != anchor]
+    per_batch = batch_size - 1
+    return [others[i:i + per_batch] for i in range(0, len(others), per_batch)] or [[]]
+
+
+def rescale_batches(frames, bridges):
+    """
+    Puts batch frames (each normalized 0-100 on its own) onto the scale of the
+    first one. Batch k shares bridges[k] with the earlier batches and is scaled
+    by the ratio of the bridge's total interest there to its total in batch k.
+    A batch whose bridge has no interest cannot be placed and is skipped.
+    Returns (frame with a column per keyword, skipped keywords).
+    """
+    index = frames[0].index
+    scaled = {}
+    skipped = []
+    for df, bridge in zip(frames, bridges):
+        values = df.drop(columns=["isPartial"], errors="ignore").reindex(index).astype(float)
+        scale = 1.0
+        if scaled and bridge not in values: # Empty reply
+            skipped.extend(name for name in values if name not in scaled)
+            continue
+        if scaled:
+            bridge_total, placed_total = values[bridge].sum(), scaled[bridge].sum()
+            if not (bridge_total > 0 and placed_total > 0):
+                skipped.extend(name for name in values if name not in scaled)
+                continue
+            scale = placed_total / bridge_total
+        for name in values:
+            if name not in scaled:
+                scaled[name] = values[name] * scale
+    return pd.DataFrame(scaled, index=index), skipped
+
+
+def fetch_watchlist(keywords, anchor, timeframe="today 3-m", geo="TR", hl="tr-TR", tz=180,
+                    deadline=600, cache=None):
+    """
+    Fetches a keyword watchlist in 5-term batches and returns (df, stale_age)
+    with every keyword on the scale of the anchor's batch. Each later batch is
+    bridged on the heaviest term placed so far, so the ratio is taken on large
+    values instead of a term that rounds to 0-2 next to heavier ones.
+    stale_age is the oldest cached batch used, or None if all were live/fresh.
+    """
+    started = time.monotonic()
+    frames, bridges = [], []
+    stale_age = None
+    bridge = anchor
+
+    for group in plan_batches(keywords, anchor):
+        remaining = max(deadline - (time.monotonic() - started), 1)
+        df, age = fetch_interest_over_time([bridge] + group, timeframe=timeframe, geo=geo, hl=hl, tz=tz,
+                                           deadline=remaining, cache=cache)
+        frames.append(df)
+        bridges.append(bridge)
+        if age is not None:
+            stale_age = max(stale_age or 0, age)
+        totals = rescale_batches(frames, bridges)[0].sum()
+        if len(totals) and totals.max() > 0:
+            bridge = totals.idxmax() # Heaviest term so far bridges the next batch
+
+    combined, skipped = rescale_batches(frames, bridges)
+    if skipped:
+        print(f"Watchlist: no bridge interest for {', '.join(skipped)}; left out.")
+    return combined, stale_age
+
+
+def plan_daily_windows(start, end, window_days=240, overlap_days=60):
+    """
+    Splits [start, end] into windows short enough for daily Trends resolution
+    (Google switches to weekly points above ~270 days), each overlapping the
+    previous one by overlap_days. Returns a list of (start, end) Timestamps.
+    """
+    start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+    step = pd.Timedelta(days=window_days - overlap_days)
+    windows = []
+    window_start = start
+    while True:
+        window_end = min(window_start + pd.Timedelta(days=window_days - 1), end)
+        windows.append((window_start, window_end))
+        if window_end >= end:
+            return windows
+        window_start += step
+
+
+def stitch_windows(series_list):
+    """
+    Chains overlapping windows (each normalized 0-100 on its own) onto one
+    scale: every window is rescaled by the ratio of its overlap total to the
+    already-scaled previous window's. Overlapping days are averaged and the
+    result is normalized back to 0-100.
+    """
+    scaled = [series_list[0].astype(float)]
+    scale = 1.0
+    for series in series_list[1:]:
+        previous = scaled[-1]
+        overlap = previous.index.intersection(series.index)
+        previous_total, current_total = previous[overlap].sum(), series[overlap].sum()
+        if previous_total > 0 and current_total > 0:
+            scale = previous_total / current_total
+        else: # No signal on the overlap: keep the last known scale
+            print(f"Trends window from {series.index[0].date()} has no overlap signal; reusing the previous scale.")
+        scaled.append(series.astype(float) * scale)
+
+    stitched = pd.concat(scaled).groupby(level=0).mean()
+    peak = stitched.max()
+    return stitched * (100 / peak) if peak > 0 else stitched
+
+
+def fetch_daily_history(keyword, start, end, geo="TR", hl="tr-TR", tz=180, window_days=240, overlap_days=60,
+                        max_workers=3, deadline=900, cache=None):
+    """
+    Multi-year daily interest for one keyword, stitched from overlapping
+    daily-resolution windows fetched concurrently (the shared scheduler still
+    paces the requests). Returns (series, stale_age) like fetch_watchlist.
+    """
+    cache = cache or TrendsCache()
+    # Trends revises the last few days; windows that closed earlier never change
+    history_cache = TrendsCache(os.path.join(cache.root, "history"), ttl=float("inf"), max_age=None)
+    settled = pd.Timestamp.fromtimestamp(transport.now_ms() / 1000).normalize() - pd.Timedelta(days=SETTLE_DAYS)
+    started = time.monotonic()
+
+    def fetch(window):
+        window_start, window_end = window
+        timeframe = f"{window_start:%Y-%m-%d} {window_end:%Y-%m-%d}"
+        remaining = max(deadline - (time.monotonic() - started), 1)
+        df, age = fetch_interest_over_time([keyword], timeframe=timeframe, geo=geo, hl=hl, tz=tz, deadline=remaining,
+                                           cache=history_cache if window_end < settled else cache)
+        return df[keyword], age
+
+    windows = plan_daily_windows(start, end, window_days, overlap_days)
+    print(f"Fetching {len(windows)} overlapping Trends windows for '{keyword}'...")
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(fetch, windows))
+
+    ages = [age for _, age in results if age is not None]
+    stitched = stitch_windows([series for series, _ in results]).rename(keyword)
+    return stitched, max(ages) if ages else None
+
+
+def rolling_zscores(df, window):
+    """
+    Rolling z-score of every column in one vectorized pass.
+    """
+    rolling = df.rolling(window=window)
+    std = rolling.std()
+    return (df - rolling.mean()) / std.where(std > 0) # Flat series -> NaN, not inf
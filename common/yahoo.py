@@ -0,0 +1,74 @@
+"""
+Yahoo Finance chart API over the shared transport.
+
+Returns frames shaped like yf.download(): Open/High/Low/Close/Volume columns,
+intraday bars indexed by UTC timestamps, daily bars by the exchange-local date.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from .ratelimit import YAHOO_HOST
+from .transport import transport
+
+BASE_URL = os.environ.get("YAHOO_BASE_URL", f"https://{YAHOO_HOST}")
+CHART_PATH = "/v8/finance/chart/"
+DAILY_INTERVALS = ("1d", "5d", "1wk", "1mo", "3mo")
+
+
+def fetch_chart(symbol, interval="1h", days=30):
+    """
+    Fetches the last `days` days of bars for symbol. Returns an empty frame on errors.
+    """
+    end = transport.now_ms() // 1000
+    params = {
+        "interval": interval,
+        "period1": end - days * 86_400,
+        "period2": end,
+        "includePrePost": "false"
+    }
+    response = transport.get(BASE_URL + CHART_PATH + symbol, params=params, timeout=10)
+    try:
+        chart = response.json().get("chart", {})
+    except ValueError:
+        chart = {"error": f"HTTP {response.status_code}"}
+
+    if chart.get("error") or not chart.get("result"):
+        print(f"Yahoo chart error for {symbol}: {chart.get('error')}")
+        return pd.DataFrame()
+
+    result = chart["result"][0]
+    timestamps = result.get("timestamp")
+    if not timestamps:
+        return pd.DataFrame()
+
+    quote = result["indicators"]["quote"][0]
+    index = pd.to_datetime(np.asarray(timestamps, dtype=np.int64), unit="s", utc=True)
+    if interval in DAILY_INTERVALS:
+        exchange_tz = result["meta"].get("exchangeTimezoneName", "UTC")
+        index = index.tz_convert(exchange_tz).normalize().tz_localize(None)
+
+    df = pd.DataFrame({
+        name.capitalize(): np.asarray(quote.get(name) or [np.nan] * len(timestamps), dtype=np.float64)
+        for name in ("open", "high", "low", "close", "volume")
+    }, index=pd.DatetimeIndex(index, name="Date" if interval in DAILY_INTERVALS else "Datetime"))
+
+    # Yahoo pads missing bars with nulls
+    return df.dropna(subset=["Close"])
+
+
+def fetch_usd_try(days=30, interval="1h"):
+    """
+    USD/TRY closes as a USD_Close frame indexed by naive Turkey Time (empty on errors).
+    """
+    usd_try = fetch_chart("TRY=X", interval=interval, days=days)
+    if usd_try.empty:
+        return pd.DataFrame()
+
+    usd_try = usd_try[["Close"]].rename(columns={"Close": "USD_Close"})
+    if usd_try.index.tz is None:
+        usd_try.index = usd_try.index.tz_localize("UTC")
+    # Convert to Turkey Time (Etc/GMT-3 is UTC+3) and drop the tz for easy merging
+    usd_try.index = usd_try.index.tz_convert("Etc/GMT-3").tz_localize(None)
+    return usd_try
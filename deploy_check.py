@@ -1,7 +1,8 @@
-import requests
 import os
 import datetime
 
+from common.telegram import send_telegram_alert
+
 def send_deployment_telegram():
     token = os.environ.get("TELEGRAM_BOT_TOKEN")
     chat_id = os.environ.get("TELEGRAM_CHAT_ID")
@@ -29,21 +30,7 @@ The "Ghost Bot" is also active and will run daily at 18:15 TRT.
 _This is a one-time confirmation message._
     """
     
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    payload = {
-        "chat_id": chat_id,
-        "text": message,
-        "parse_mode": "Markdown"
-    }
-    
-    try:
-        response = requests.post(url, json=payload, timeout=10)
-        if response.status_code == 200:
-            print("Deployment Telegram alert sent successfully.")
-        else:
-            print(f"Error sending Telegram alert: {response.text}")
-    except Exception as e:
-        print(f"Error sending Telegram alert: {e}")
+    send_telegram_alert(message)
 
 if __name__ == "__main__":
     send_deployment_telegram()
@@ -1,86 +1,157 @@
+import argparse
 import os
+import random
 import sys
+import time
 import pandas as pd
-import requests
-from pytrends.request import TrendReq
 
+from common.kline_store import ROOT_DIR
+from common.streaming import WindowState, state_path
+from common.telegram import send_telegram_alert
+from common.transport import transport
+from common.trends import SETTLE_DAYS, fetch_daily_history, fetch_interest_over_time, fetch_watchlist, rolling_zscores
 
-def send_telegram_alert(message):
-    token = os.environ.get("TELEGRAM_BOT_TOKEN")
-    chat_id = os.environ.get("TELEGRAM_CHAT_ID")
-    
-    if not token or not chat_id:
-        print("Error: Telegram credentials not found in environment variables.")
-        return
-        
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    payload = {
-        "chat_id": chat_id,
-        "text": message,
-        "parse_mode": "Markdown"
-    }
-    
-    try:
-        response = requests.post(url, json=payload, timeout=10)
-        if response.status_code == 200:
-            print("Telegram alert sent successfully.")
-        else:
-            print(f"Error sending Telegram alert: {response.text}")
-    except Exception as e:
-        print(f"Error sending Telegram alert: {e}")
+# --- CONFIGURATION ---
+KEYWORDS = ["Halka Arz"]
+FETCH_DEADLINE = 240 # Seconds the whole Trends fetch (incl. start delay) may take
+WINDOW = 30 # Rolling z-score window in days
+THRESHOLD = 1.5
+HISTORY_TIMEFRAME = 'today 3-m' # Full refetch (no usable state)
+HISTORY_DAYS = 90
+OVERLAP_DAYS = 10 # Stored days fetched again to carry the scale over (under ~8 days Trends goes hourly)
+MIN_OVERLAP = 3
+
+# Watchlist mode: packed into 5-term batches that all share KEYWORDS[0] as anchor
+WATCHLIST = [
+    "Halka Arz", "Borsa", "BIST 100", "Dolar", "Euro", "Altın", "Gram Altın", "Faiz",
+    "Enflasyon", "Bitcoin", "Kripto", "Temettü", "Hisse", "Kredi", "Mevduat",
+]
+WATCHLIST_DEADLINE = 600
+REPLAY_PATH = os.path.join(ROOT_DIR, "data", "replay", "ghost_history.csv")
 
-def main():
+
+def rescale_to_state(state, series):
+    """
+    Puts a freshly fetched series (normalized 0-100 on its own timeframe) on the
+    scale of the stored window, using the days both cover. Returns None when
+    the overlap is too short or empty to anchor it.
+    """
+    stored = state.series()
+    overlap = stored.index.intersection(series.index)
+    if len(overlap) < MIN_OVERLAP:
+        return None
+    stored_total, fetched_total = stored[overlap].sum(), series[overlap].sum()
+    if stored_total <= 0 or fetched_total <= 0:
+        return None
+    return series.astype(float) * (stored_total / fetched_total)
+
+
+def fetch_trends(timeframe, deadline, watchlist=False):
+    """
+    Fetches the timeframe within what is left of the run's deadline (a
+    time.monotonic() value), so a second fetch never gets a fresh budget.
+    """
+    remaining = max(deadline - time.monotonic(), 1) # Still lets the fetch fall back to its cache
+    if watchlist:
+        return fetch_watchlist(
+            WATCHLIST, anchor=KEYWORDS[0], timeframe=timeframe, geo='TR', hl='tr-TR', deadline=remaining
+        )
+    return fetch_interest_over_time(
+        KEYWORDS, timeframe=timeframe, geo='TR', hl='tr-TR', deadline=remaining
+    )
+
+
+def decide(z_score):
+    """
+    Returns (status, action_text) for a z-score.
+    """
+    if z_score > THRESHOLD:
+        return "🚀 MOMENTUM LONG", "-> BUY BIST 30\n-> HOLD: 3 Gün"
+    return "😐 NEUTRAL / WAIT", "-> NO ACTION REQUIRED"
+
+
+def build_message(z_score, latest_val, latest_mean, data_note="", watch_note=""):
+    status, action_text = decide(z_score)
+    return f"""
+*👻 GHOST BOT DAILY REPORT*
+----------------
+*Sinyal:* {status}
+{data_note}
+*İstatistikler:*
+*Z-Score:* {z_score:.2f} (Eşik: {THRESHOLD})
+*Güncel İlgi:* {latest_val:.0f}
+*30 Günlük Ort:* {latest_mean:.2f}
+{watch_note}
+*ACTION:*
+{action_text}
+
+_Bu otomatik bir mesajdır._
+    """
+
+
+def main(watchlist=False, state_file=None, rebuild=False):
     print("--- GHOST BOT: STARTED ---")
+    col = KEYWORDS[0]
+    today = pd.Timestamp.fromtimestamp(transport.now_ms() / 1000).normalize()
+    
+    # 0. Finalized days of earlier runs: a normal day only fetches the days since then
+    state_file = state_file or state_path("ghost")
+    state = WindowState(WINDOW, state_file) if rebuild else WindowState.load(WINDOW, state_file)
+    incremental = (len(state) >= MIN_OVERLAP
+                   and (today - state.last_day).days <= HISTORY_DAYS)
     
-    # 1. Fetch Data (Last 90 Days)
+    # 1. Fetch Data (new days plus a few stored ones, or the last 90 days)
     try:
         # Add random start delay to avoid synchronized patterns
-        import random
-        import time
+        started = time.monotonic()
+        deadline = started + FETCH_DEADLINE # Keyword fetches, incl. start delay
         start_delay = random.randint(5, 30)
         print(f"Waiting {start_delay}s before starting to avoid detection...")
         time.sleep(start_delay)
 
         print("Fetching Google Trends data...")
         
-        # Configure retries for 429 errors
-        session = requests.Session()
-        retries = requests.adapters.Retry(
-            total=5,
-            backoff_factor=1, 
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["GET", "POST"]
-        )
-        session.mount("https://", requests.adapters.HTTPAdapter(max_retries=retries))
-        
-        pytrends = TrendReq(hl='tr-TR', tz=180, requests_args={'verify': True}, timeout=(10,25))
-        
-        # Aggressive Retry Loop
-        max_retries = 10
-        df = pd.DataFrame()
-        
-        for attempt in range(max_retries):
+        # Bounded live fetch; falls back to the last good series if Google throttles us
+        series = None
+        stale_age = None
+        from_state = False # No live data: report the stored window as it stands
+        persist = True # Only live data (or an explicit rebuild) may replace the stored window
+        if incremental:
+            start = state.days[-OVERLAP_DAYS] if len(state) >= OVERLAP_DAYS else state.days[0]
             try:
-                kw_list = ["Halka Arz"]
-                pytrends.build_payload(kw_list, cat=0, timeframe='today 3-m', geo='TR', gprop='')
-                df = pytrends.interest_over_time()
+                df, stale_age = fetch_trends(f"{start:%Y-%m-%d} {today:%Y-%m-%d}", deadline)
                 if not df.empty:
-                    break
+                    series = rescale_to_state(state, df[col])
+                if series is None:
+                    print("Fetched days do not line up with the stored state; refetching the full history.")
+            except Exception as e:
+                print(f"Incremental fetch failed ({e}); reporting from the stored window.")
+                from_state = True
+        if series is None and not from_state:
+            try:
+                df, stale_age = fetch_trends(HISTORY_TIMEFRAME, deadline)
             except Exception as e:
-                print(f"Attempt {attempt+1} failed: {e}")
-                if attempt < max_retries - 1:
-                    # Randomized Exponential Backoff: 2^n + random jitter
-                    sleep_time = (2 ** (attempt + 1)) + random.randint(1, 10)
-                    print(f"Sleeping {sleep_time}s...")
-                    time.sleep(sleep_time) 
+                if not incremental:
+                    raise
+                print(f"Full fetch failed ({e}); reporting from the stored window.")
+                from_state = True
+            else:
+                if incremental and (df.empty or stale_age is not None):
+                    # A cached 3-month series can be older than the stored window: never let it replace it
+                    print("No live full history; reporting from the stored window.")
+                    from_state = True
+                elif df.empty:
+                    print("No data found.")
+                    return
                 else:
-                    raise e
+                    series = df[col].astype(float)
+                    state = WindowState(WINDOW, state_file) # The full history replaces the stored scale
+                    persist = stale_age is None or rebuild
 
-        if df.empty:
-            print("No data found.")
-            return
-            
-        print(f"Data fetched: {len(df)} rows.")
+        if from_state:
+            stale_age = None # Aged by the stored window's last day instead
+        else:
+            print(f"Data fetched: {len(df)} rows.")
         
     except Exception as e:
         print(f"Error fetching data: {e}")
@@ -88,60 +159,139 @@ def main():
         sys.exit(1)
 
     # 2. Calculate Z-Score
-    # We use a 30-day rolling window as defined in Phase 4
-    window = 30
-    col = "Halka Arz"
+    # We use a 30-day rolling window as defined in Phase 4, kept as running sums between runs
+    if from_state:
+        pending = pd.Series(dtype=float)
+    else:
+        if state.last_day is not None:
+            series = series[series.index > state.last_day]
+        settled = series.index < today - pd.Timedelta(days=SETTLE_DAYS)
+        if state.finalize(series[settled]) and persist:
+            state.save()
+        pending = series[~settled] # Still revised by Google: scored, not stored
     
     # Ensure we have enough data
-    if len(df) < window:
+    if len(state.rolling) + len(pending) < WINDOW:
         print("Not enough data for rolling window.")
         return
 
-    rolling_mean = df[col].rolling(window=window).mean()
-    rolling_std = df[col].rolling(window=window).std()
-    
     # Calculate latest Z-Score
-    latest_val = df[col].iloc[-1]
-    latest_mean = rolling_mean.iloc[-1]
-    latest_std = rolling_std.iloc[-1]
+    latest_val = pending.iloc[-1] if len(pending) else state.rolling.values[-1]
+    latest_mean, latest_std = state.score(*pending)
     
     if latest_std == 0:
         z_score = 0
     else:
         z_score = (latest_val - latest_mean) / latest_std
         
-    print(f"Latest Value: {latest_val}")
+    print(f"Latest Value: {latest_val:.0f}")
     print(f"Rolling Mean (30d): {latest_mean:.2f}")
     print(f"Z-Score: {z_score:.2f}")
+    if stale_age is not None:
+        print(f"WARNING: Report uses cached data ({stale_age / 3600:.1f} h old).")
+    if from_state:
+        print(f"WARNING: No live data; report uses the stored window (last day {state.last_day:%Y-%m-%d}).")
     
     # 3. Decision Logic
-    THRESHOLD = 1.5
+    watch_note = ""
+    if watchlist:
+        # A separate fetch: the watchlist never touches the keyword's stored window
+        try:
+            watch_df, watch_age = fetch_trends(HISTORY_TIMEFRAME, started + WATCHLIST_DEADLINE, watchlist=True)
+        except Exception as e:
+            print(f"Watchlist fetch failed ({e}).")
+            watch_df, watch_age = pd.DataFrame(), None
+        if watch_age is not None:
+            print(f"WARNING: Watchlist uses cached data ({watch_age / 3600:.1f} h old).")
+        latest_z = pd.Series(dtype=float)
+        if len(watch_df):
+            # One rolling pass over every keyword (all on the anchor batch's scale)
+            columns = [kw for kw in WATCHLIST if kw in watch_df]
+            latest_z = rolling_zscores(watch_df[columns], WINDOW).iloc[-1].dropna()
+            latest_z[col] = z_score # Its own fetch beats its rounded values next to heavier terms
+            latest_z = latest_z.sort_values(ascending=False)
+        if len(latest_z):
+            print("Watchlist Z-Scores:")
+            print(latest_z.to_string(float_format="%.2f"))
+            lines = [f"- {kw}: {z:.2f}{' 🔥' if z > THRESHOLD else ''}" for kw, z in latest_z.head(5).items()]
+            watch_note = "\n*İzleme Listesi (Top 5 Z):*\n" + "\n".join(lines) + "\n"
+
+    data_note = ""
+    if stale_age is not None:
+        data_note = f"\n*⚠️ Veri:* Önbellekten ({stale_age / 3600:.1f} saat önce), canlı veri alınamadı.\n"
+    if from_state:
+        data_note = f"\n*⚠️ Veri:* Kayıtlı pencereden (son gün {state.last_day:%Y-%m-%d}), canlı veri alınamadı.\n"
+
+    message = build_message(z_score, latest_val, latest_mean, data_note=data_note, watch_note=watch_note)
     
-    if z_score > THRESHOLD:
-        status = "🚀 MOMENTUM LONG"
-        action_text = "-> BUY BIST 30\n-> HOLD: 3 Gün"
-    else:
-        status = "😐 NEUTRAL / WAIT"
-        action_text = "-> NO ACTION REQUIRED"
+    print("Sending Daily Telegram Report...")
+    send_telegram_alert(message)
 
-    message = f"""
-*👻 GHOST BOT DAILY REPORT*
-----------------
-*Sinyal:* {status}
 
-*İstatistikler:*
-*Z-Score:* {z_score:.2f} (Eşik: {THRESHOLD})
-*Güncel İlgi:* {latest_val}
-*30 Günlük Ort:* {latest_mean:.2f}
+def replay_history(series):
+    """
+    The report main() would have sent on every day of a daily interest series,
+    in one vectorized pass and without lookahead.
 
-*ACTION:*
-{action_text}
+    A live run scores the newest day against the stored window: settled days
+    it finalized earlier plus the last SETTLE_DAYS days still pending, all on
+    the stored window's continuous scale. Together they are just the WINDOW
+    days ending on that day, so every day is a plain rolling window over the
+    stitched history. z-scores do not depend on the scale; Value and
+    Rolling_Mean are on the history's scale rather than the stored window's.
+    Days Google revised after a run are replayed at their final values, and
+    without the whole-number rounding of each fetch (worth a few hundredths of z).
 
-_Bu otomatik bir mesajdır._
+    Returns a frame indexed by date with Value, Rolling_Mean, Rolling_Std,
+    Z_Score, Signal and Message; days without a full window are skipped.
     """
-    
-    print("Sending Daily Telegram Report...")
-    send_telegram_alert(message)
+    series = series.astype(float).dropna()
+    rolling = series.rolling(WINDOW)
+    mean, std = rolling.mean(), rolling.std()
+    z = ((series - mean) / std).where(std != 0, 0.0) # Flat window: main() reports 0
+
+    history = pd.DataFrame({
+        "Value": series,
+        "Rolling_Mean": mean,
+        "Rolling_Std": std,
+        "Z_Score": z,
+    }).loc[mean.notna()].rename_axis("Date")
+    history["Signal"] = [decide(z_score)[0] for z_score in history["Z_Score"]]
+    history["Message"] = [build_message(*row) for row in
+                          zip(history["Z_Score"], history["Value"], history["Rolling_Mean"])]
+    return history
+
+
+def history_main(days=730, output=REPLAY_PATH):
+    print("--- GHOST BOT: HISTORY REPLAY ---")
+    end = pd.Timestamp.fromtimestamp(transport.now_ms() / 1000).normalize()
+    series, stale_age = fetch_daily_history(KEYWORDS[0], end - pd.Timedelta(days=days), end)
+    if stale_age is not None:
+        print(f"WARNING: Replay uses cached Trends windows ({stale_age / 3600:.1f} h old).")
+
+    history = replay_history(series)
+    if history.empty:
+        print("Not enough data for rolling window.")
+        return
+    print(f"{len(history)} daily reports replayed ({history.index[0].date()} to {history.index[-1].date()}).")
+    print(history["Signal"].value_counts().to_string())
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    history.to_csv(output)
+    print(f"Saved to {output}")
+
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Ghost Bot: Halka Arz momentum report")
+    parser.add_argument("--watchlist", action="store_true", help="also score the WATCHLIST keywords (separate fetch)")
+    parser.add_argument("--state", help="z-score state file (default: $STREAM_STATE_DIR/ghost.json, data/state)")
+    parser.add_argument("--rebuild-state", action="store_true", help="ignore the saved state and refetch the full history")
+    parser.add_argument("--history", action="store_true", help="replay the report of every past day to a CSV instead")
+    parser.add_argument("--history-days", type=int, default=730, help="days of history to replay (default: 730)")
+    parser.add_argument("--output", default=REPLAY_PATH, help="replay CSV (default: data/replay/ghost_history.csv)")
+    args = parser.parse_args()
+    if args.history:
+        history_main(days=args.history_days, output=args.output)
+    else:
+        main(watchlist=args.watchlist, state_file=args.state, rebuild=args.rebuild_state)
+    transport.print_summary()
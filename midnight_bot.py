@@ -1,94 +1,42 @@
+import argparse
 import os
 import sys
 import pandas as pd
 import numpy as np
-import requests
-import yfinance as yf
 from datetime import datetime, timedelta
 
+from common.binance import TRT_OFFSET_MS, klines_frame, now_ms
+from common.kline_store import ROOT_DIR, load_klines
+from common.kline_stream import BinanceKlineStream, ReplayKlineSource
+from common.premium import USD_MAX_AGE, align_premium
+from common.streaming import WindowState, state_path
+from common.telegram import send_telegram_alert
+from common.transport import transport
+from common.yahoo import fetch_usd_try
+
 # --- CONFIGURATION ---
+SYMBOL = "USDTTRY"
+INTERVAL = "15m"
 Z_WINDOW = 20
+HISTORY_DAYS = 40 # Lookback of a full (stateless) run
+MORNING_END = pd.Timedelta(hours=10) # A night is final once its 00:00-09:59 candles are
 Z_THRESHOLD = 0.5 # Lowered for agility (Grey Swan)
-
-def send_telegram_alert(message):
-    token = os.environ.get("TELEGRAM_BOT_TOKEN")
-    chat_id = os.environ.get("TELEGRAM_CHAT_ID")
-    
-    if not token or not chat_id:
-        print("Error: Telegram credentials not found in environment variables.")
-        return
-        
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    payload = {
-        "chat_id": chat_id,
-        "text": message,
-        "parse_mode": "Markdown"
-    }
-    
-    try:
-        response = requests.post(url, json=payload, timeout=10)
-        if response.status_code == 200:
-            print("Telegram alert sent successfully.")
-        else:
-            print(f"Error sending Telegram alert: {response.text}")
-    except Exception as e:
-        print(f"Error sending Telegram alert: {e}")
+DECISION_TIME = "09:50" # TRT, stream and history modes
+REPLAY_PATH = os.path.join(ROOT_DIR, "data", "replay", "midnight_history.csv")
 
 def fetch_binance_klines(days=40):
     """
     Fetches historical klines from Binance for USDT/TRY.
+    Closed candles come from the local kline store; only the delta since the
+    last stored candle is downloaded.
     """
-    symbol = "USDTTRY"
-    interval = "15m"
-    base_url = "https://api.binance.com/api/v3/klines"
-    
-    end_time = int(datetime.now().timestamp() * 1000)
-    all_data = []
-    
-    # Estimate loops needed: 96 candles/day * days / 1000 limit
-    loops = int((days * 96) / 1000) + 2
-    
-    current_end = end_time
-    for _ in range(loops): 
-        params = {
-            "symbol": symbol,
-            "interval": interval,
-            "limit": 1000,
-            "endTime": current_end
-        }
-        try:
-            response = requests.get(base_url, params=params, timeout=10)
-            data = response.json()
-            
-            if not data or isinstance(data, dict) and "code" in data: # Error or empty
-                break
-                
-            all_data = data + all_data # Prepend to keep order
-            current_end = data[0][0] - 1 # Move back in time
-            
-            # Stop if we have enough data
-            if len(all_data) > days * 96:
-                break
-        except Exception as e:
-            print(f"Error fetching Binance data: {e}")
-            break
-        
-    if not all_data:
+    # Keep the in-progress candle so the current night is complete
+    columns = load_klines(SYMBOL, INTERVAL, days, columns=["open_time", "close"], include_open=True)
+
+    if len(columns["open_time"]) == 0:
         return pd.DataFrame()
 
-    df = pd.DataFrame(all_data, columns=[
-        "OpenTime", "Open", "High", "Low", "Close", "Volume", 
-        "CloseTime", "QuoteAssetVolume", "Trades", "TakerBuyBase", "TakerBuyQuote", "Ignore"
-    ])
-    
-    df["Date"] = pd.to_datetime(df["OpenTime"], unit="ms")
-    df["USDT_Close"] = df["Close"].astype(float)
-    df = df[["Date", "USDT_Close"]]
-    
-    # Adjust to Turkey Time (UTC+3)
-    df["Date"] = df["Date"] + pd.Timedelta(hours=3)
-    
-    return df.set_index("Date")
+    return klines_frame(columns)
 
 def fetch_yahoo_usd(days=40):
     """
@@ -97,24 +45,8 @@ def fetch_yahoo_usd(days=40):
     print("Fetching USD/TRY from Yahoo...")
     try:
         # Fetch a bit more to be safe
-        period = f"{days+5}d"
-        # Yahoo interval 1h is good for alignment with 15m
-        usd_try = yf.download("TRY=X", period=period, interval="1h", progress=False)
-        
-        if usd_try.empty:
-            return pd.DataFrame()
-            
-        usd_try = usd_try[["Close"]].rename(columns={"Close": "USD_Close"})
-        
-        # Timezone handling
-        if usd_try.index.tz is None:
-            usd_try.index = usd_try.index.tz_localize("UTC")
-        
-        # Convert to Turkey Time (Etc/GMT-3 is UTC+3)
-        usd_try.index = usd_try.index.tz_convert("Etc/GMT-3") 
-        usd_try.index = usd_try.index.tz_localize(None) # Remove tz info for easy merging
-        
-        return usd_try
+        # Yahoo interval 1h is good for alignment with 15m (naive Turkey Time)
+        return fetch_usd_try(days=days + 5, interval="1h")
     except Exception as e:
         print(f"Error fetching Yahoo data: {e}")
         return pd.DataFrame()
@@ -126,25 +58,11 @@ def calculate_nightly_premium_history(usdt_df, usd_df):
     if usdt_df.empty or usd_df.empty:
         return pd.Series()
 
-    # Create a common 15m index covering the range
-    start_date = max(usdt_df.index.min(), usd_df.index.min())
-    end_date = min(usdt_df.index.max(), usd_df.index.max())
-    
-    full_idx = pd.date_range(start=start_date, end=end_date, freq="15min")
-    df = pd.DataFrame(index=full_idx)
-    
-    # Merge USDT (Exact matches)
-    df = df.join(usdt_df)
-    
-    # Merge USD (Forward Fill)
-    usd_resampled = usd_df.reindex(full_idx, method='ffill')
-    df["USD_Close"] = usd_resampled["USD_Close"]
-    
-    # Forward fill USD for weekends/nights
-    df["USD_Close"] = df["USD_Close"].ffill()
-    
-    # Calculate Premium
-    df["Premium"] = (df["USDT_Close"] / df["USD_Close"]) - 1
+    # Latest USD quote for every USDT bar (as-of join, no dense 15m grid)
+    df = align_premium(usdt_df, usd_df, tolerance=USD_MAX_AGE)
+    stale = int(df.loc[df.index > df.index[-1] - pd.Timedelta(days=1), "Stale_USD"].sum()) if len(df) else 0
+    if stale:
+        print(f"Warning: {stale} bars in the last 24h use a USD quote older than {USD_MAX_AGE}.")
     
     # Aggregate to Daily "Nightly Premium"
     # We want to average the premium during the night (e.g., 18:00 to 09:30 next day)
@@ -164,49 +82,10 @@ def calculate_nightly_premium_history(usdt_df, usd_df):
     return daily_prem.dropna()
 
 
-def main():
-    print("--- MIDNIGHT HUNTER: STARTED ---")
-    
-    # 1. Fetch Data
-    print("Fetching data...")
-    usdt = fetch_binance_klines(days=40) 
-    usd = fetch_yahoo_usd(days=40)
-    
-    # 2. Calculate History
-    print("Calculating premiums...")
-    daily_prem = calculate_nightly_premium_history(usdt, usd)
-    
-    if len(daily_prem) < Z_WINDOW:
-        print(f"Not enough data. Need {Z_WINDOW} days, got {len(daily_prem)}.")
-        return
-
-    # 3. Calculate Z-Score
-    rolling_mean = daily_prem.rolling(window=Z_WINDOW).mean()
-    rolling_std = daily_prem.rolling(window=Z_WINDOW).std()
-    
-    today = datetime.now().date()
-    # Check if we have data for 'today' (morning)
-    if today not in daily_prem.index:
-        print(f"No data for today ({today}). Market might not be open or data delayed.")
-        # Fallback to last available day for testing/demo
-        latest_date = daily_prem.index[-1]
-        print(f"Using last available date: {latest_date}")
-        current_prem = daily_prem.iloc[-1]
-        current_mean = rolling_mean.iloc[-1]
-        current_std = rolling_std.iloc[-1]
-    else:
-        current_prem = daily_prem.loc[today]
-        current_mean = rolling_mean.loc[today]
-        current_std = rolling_std.loc[today]
-        
-    z_score = (current_prem - current_mean) / current_std
-    
-    print(f"Date: {today}")
-    print(f"Nightly Premium: {current_prem*100:.4f}%")
-    print(f"Rolling Mean (20d): {current_mean*100:.4f}%")
-    print(f"Z-Score: {z_score:.2f}")
-    
-    # 4. Decision (T+1 Strategy)
+def decide(z_score):
+    """
+    T+1 decision for a nightly premium z-score. Returns (action, reason).
+    """
     action = "WAIT"
     reason = "Z-Score within normal range"
     
@@ -217,11 +96,12 @@ def main():
         action = "LONG"
         reason = f"Relief Dip (Z < -{Z_THRESHOLD})"
         
-    print(f"DECISION: {action} ({reason})")
-    
-    # 5. Alert - ALWAYS send report, even if action is WAIT
+    return action, reason
+
+
+def build_message(today, action, reason, current_prem, current_mean, z_score):
     if action != "WAIT":
-        message = f"""
+        return f"""
 *🦅 MIDNIGHT HUNTER: {action} SIGNAL (T+1)*
 ----------------------
 *Date:* {today}
@@ -240,10 +120,8 @@ def main():
 
 _Good hunting._
         """
-        send_telegram_alert(message)
-    else:
-        # Send daily report even when no action signal
-        message = f"""
+    # Daily report even when no action signal
+    return f"""
 *📊 MIDNIGHT HUNTER: Daily Report*
 ----------------------
 *Date:* {today}
@@ -257,8 +135,277 @@ _Good hunting._
 
 _Monitoring continues..._
         """
-        send_telegram_alert(message)
+
+
+def report(today, current_prem, current_mean, current_std):
+    """
+    Scores the night, decides and sends the Telegram report.
+    """
+    z_score = (current_prem - current_mean) / current_std
+    
+    print(f"Date: {today}")
+    print(f"Nightly Premium: {current_prem*100:.4f}%")
+    print(f"Rolling Mean (20d): {current_mean*100:.4f}%")
+    print(f"Z-Score: {z_score:.2f}")
+    
+    # 4. Decision (T+1 Strategy)
+    action, reason = decide(z_score)
+    print(f"DECISION: {action} ({reason})")
+    
+    # 5. Alert - ALWAYS send report, even if action is WAIT
+    send_telegram_alert(build_message(today, action, reason, current_prem, current_mean, z_score))
+    if action == "WAIT":
         print("Daily report sent (no action signal).")
 
+
+class NightMonitor:
+    """
+    Keeps the nightly premium (mean premium of the 00:00-09:59 TRT candles) up
+    to date from kline stream events, so the daily decision is a lookup over
+    the nights seen so far instead of a fetch-and-recompute.
+    """
+    def __init__(self, usdt, usd, decision_time=DECISION_TIME, refresh_usd=None):
+        self.usd = usd
+        self.refresh_usd = refresh_usd
+        self.last_usd_refresh = None
+        self.decision_time = tuple(int(part) for part in decision_time.split(":"))
+        self.decided = set()
+        self.live = None # (night, premium) of the candle still in progress
+
+        # Seed the per-night premium sums from the REST history
+        premium = usdt["USDT_Close"].to_numpy() / self.usd_at(usdt.index) - 1
+        morning = (usdt.index.hour < 10) & ~np.isnan(premium)
+        seed = pd.Series(premium[morning], index=usdt.index[morning].normalize())
+        grouped = seed.groupby(level=0).agg(["sum", "count"])
+        self.nights = {night: [row["sum"], int(row["count"])] for night, row in grouped.iterrows()}
+        self.last_open = usdt.index[-1] if len(usdt) else None
+
+    def usd_at(self, times):
+        """
+        Latest USD/TRY quote at or before each time (NaN before the first quote).
+        """
+        idx = self.usd.index.searchsorted(times, side="right") - 1
+        values = self.usd["USD_Close"].to_numpy()[np.clip(idx, 0, None)]
+        return np.where(idx >= 0, values, np.nan)
+
+    def on_event(self, msg):
+        k = msg["k"]
+        opened = pd.Timestamp(k["t"] + TRT_OFFSET_MS, unit="ms")
+        now = pd.Timestamp(msg["E"] + TRT_OFFSET_MS, unit="ms")
+
+        if self.refresh_usd and (self.last_usd_refresh is None or now - self.last_usd_refresh >= pd.Timedelta(hours=1)):
+            fresh = self.refresh_usd()
+            if not fresh.empty:
+                self.usd = pd.concat([self.usd, fresh]).groupby(level=0).last()
+            self.last_usd_refresh = now
+
+        if opened.hour < 10 and (self.last_open is None or opened > self.last_open):
+            premium = float(k["c"]) / self.usd_at([opened])[0] - 1
+            if k["x"]: # Candle closed: fold it into its night
+                if not np.isnan(premium):
+                    night = self.nights.setdefault(opened.normalize(), [0.0, 0])
+                    night[0] += premium
+                    night[1] += 1
+                self.last_open = opened
+                self.live = None
+            else:
+                self.live = (opened.normalize(), premium)
+
+        today = now.normalize()
+        if today not in self.decided and (now.hour, now.minute) >= self.decision_time:
+            self.decided.add(today)
+            self.decide(today)
+
+    def night_premiums(self):
+        nights = dict(self.nights)
+        if self.live is not None and not np.isnan(self.live[1]):
+            # Like the REST run, count the in-progress candle
+            total, count = nights.get(self.live[0], [0.0, 0])
+            nights[self.live[0]] = [total + self.live[1], count + 1]
+        dates = sorted(nights)
+        return pd.Series([nights[d][0] / nights[d][1] for d in dates], index=pd.DatetimeIndex(dates))
+
+    def decide(self, today):
+        daily_prem = self.night_premiums()
+        if len(daily_prem) < Z_WINDOW:
+            print(f"Not enough data. Need {Z_WINDOW} days, got {len(daily_prem)}.")
+            return
+
+        if today not in daily_prem.index:
+            print(f"No data for today ({today.date()}). Using last available date: {daily_prem.index[-1]}")
+        else:
+            daily_prem = daily_prem.loc[:today]
+        window = daily_prem.iloc[-Z_WINDOW:]
+        report(today.date(), window.iloc[-1], window.mean(), window.std())
+
+        # Only the last Z_WINDOW nights are ever needed again
+        for night in daily_prem.index[:-Z_WINDOW]:
+            self.nights.pop(night, None)
+
+
+def stream_main(replay=None, speed=1.0, record=None, decision_time=DECISION_TIME, usd_rate=None):
+    print("--- MIDNIGHT HUNTER: STREAM MODE ---")
+    offline = replay is not None
+
+    # Bootstrap once from REST (offline: whatever the kline store already holds)
+    usdt = klines_frame(load_klines(SYMBOL, INTERVAL, HISTORY_DAYS, columns=["open_time", "close"], offline=offline))
+    if usd_rate is not None: # Pinned rate, e.g. for offline replays
+        usd = pd.DataFrame({"USD_Close": [usd_rate]}, index=pd.DatetimeIndex([pd.Timestamp(0)]))
+    else:
+        usd = fetch_yahoo_usd(days=HISTORY_DAYS)
+    if usd.empty:
+        print("No USD/TRY data, cannot compute premiums (pass --usd-rate to pin one).")
+        return
+
+    monitor = NightMonitor(usdt, usd, decision_time=decision_time,
+                           refresh_usd=None if offline or usd_rate else (lambda: fetch_yahoo_usd(days=1)))
+    if replay:
+        source = ReplayKlineSource(replay, speed=speed)
+    else:
+        source = BinanceKlineStream(SYMBOL, INTERVAL, record_path=record)
+
+    for msg in source:
+        monitor.on_event(msg)
+
+
+def main(state_file=None, rebuild=False):
+    print("--- MIDNIGHT HUNTER: STARTED ---")
+    
+    # 0. Finalized nights of earlier runs (only the nights since then are recomputed)
+    state_file = state_file or state_path("midnight")
+    state = WindowState(Z_WINDOW, state_file) if rebuild else WindowState.load(Z_WINDOW, state_file)
+    now = pd.Timestamp(now_ms() + TRT_OFFSET_MS, unit="ms")
+    if state.last_day is not None and (now.normalize() - state.last_day).days > HISTORY_DAYS:
+        print(f"Premium state ends {state.last_day.date()}, too old to extend. Rebuilding.")
+        state = WindowState(Z_WINDOW, state_file)
+    days = HISTORY_DAYS if state.last_day is None else (now.normalize() - state.last_day).days + 1
+    
+    # 1. Fetch Data
+    print(f"Fetching data ({days} days)...")
+    usdt = fetch_binance_klines(days=days) 
+    usd = fetch_yahoo_usd(days=days)
+    
+    # 2. Calculate the new nights and finalize the complete ones
+    print("Calculating premiums...")
+    daily_prem = calculate_nightly_premium_history(usdt, usd)
+    if state.last_day is not None:
+        daily_prem = daily_prem[daily_prem.index > state.last_day]
+    complete = daily_prem.index + MORNING_END <= now
+    if state.finalize(daily_prem[complete]):
+        state.save()
+    current = daily_prem[~complete] # Tonight, still in progress
+    
+    available = len(state.rolling) + len(current)
+    if available < Z_WINDOW:
+        print(f"Not enough data. Need {Z_WINDOW} days, got {available}.")
+        return
+
+    # 3. Calculate Z-Score (O(1) against the stored window)
+    today = datetime.fromtimestamp(now_ms() / 1000).date()
+    if len(current):
+        current_prem = current.iloc[-1]
+        current_mean, current_std = state.score(current_prem)
+    else:
+        if state.last_day.date() != today:
+            print(f"No data for today ({today}). Market might not be open or data delayed.")
+            # Fallback to last available day for testing/demo
+            print(f"Using last available date: {state.last_day}")
+        current_prem = state.rolling.values[-1]
+        current_mean, current_std = state.rolling.stats()
+        
+    report(today, current_prem, current_mean, current_std)
+
+def replay_history(usdt, usd, decision_time=DECISION_TIME):
+    """
+    The decision main() would have made at decision_time on every past day, in
+    one vectorized pass and without lookahead: that day's premium is the mean
+    of its candles opened before decision_time (the last one at its final
+    close, where a live run sees its price so far), scored against the
+    Z_WINDOW - 1 complete nights before it. Each candle uses the USD quote
+    as of its open; a live run also drops candles newer than Yahoo's latest
+    quote, so a lagging feed can make it average fewer of them.
+
+    Returns a frame indexed by date with Premium, Rolling_Mean, Rolling_Std,
+    Z_Score, Action, Reason and Message; days without enough nights are skipped.
+    """
+    columns = ["Premium", "Rolling_Mean", "Rolling_Std", "Z_Score", "Action", "Reason", "Message"]
+    if usdt.empty or usd.empty:
+        return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name="Date"))
+
+    df = align_premium(usdt, usd, tolerance=USD_MAX_AGE)
+    morning = df.loc[df.index.hour < 10, "Premium"]
+    nights = morning.resample("D").mean().dropna() # Complete nights, as the state stores them
+    cutoff = pd.Timedelta(decision_time + ":00")
+    partial = morning[morning.index - morning.index.normalize() < cutoff].resample("D").mean().dropna()
+
+    # Window of every day: the Z_WINDOW - 1 nights before it plus its own partial night
+    previous = nights.index.searchsorted(partial.index, side="left") # Nights [previous - Z_WINDOW + 1, previous)
+    enough = previous >= Z_WINDOW - 1
+    partial, previous = partial[enough], previous[enough]
+    if len(partial):
+        stored = np.lib.stride_tricks.sliding_window_view(nights.to_numpy(), Z_WINDOW - 1)
+        windows = np.column_stack([stored[previous - Z_WINDOW + 1], partial.to_numpy()])
+    else:
+        windows = np.empty((0, Z_WINDOW))
+    mean, std = windows.mean(axis=1), windows.std(axis=1, ddof=1)
+
+    history = pd.DataFrame({
+        "Premium": partial.to_numpy(),
+        "Rolling_Mean": mean,
+        "Rolling_Std": std,
+        "Z_Score": (partial.to_numpy() - mean) / std,
+    }, index=partial.index.rename("Date"))
+    decisions = [decide(z_score) for z_score in history["Z_Score"]]
+    history["Action"] = [action for action, _ in decisions]
+    history["Reason"] = [reason for _, reason in decisions]
+    history["Message"] = [build_message(day.date(), action, reason, prem, prem_mean, z_score)
+                          for day, (action, reason), prem, prem_mean, z_score in
+                          zip(history.index, decisions, history["Premium"], history["Rolling_Mean"], history["Z_Score"])]
+    return history[columns]
+
+
+def history_main(days=365, output=REPLAY_PATH, decision_time=DECISION_TIME, usd_rate=None):
+    print("--- MIDNIGHT HUNTER: HISTORY REPLAY ---")
+    print(f"Fetching data ({days} days)...")
+    usdt = fetch_binance_klines(days=days)
+    if usd_rate is not None:
+        usd = pd.DataFrame({"USD_Close": [usd_rate]}, index=pd.DatetimeIndex([pd.Timestamp(0)]))
+    else:
+        usd = fetch_yahoo_usd(days=days)
+
+    history = replay_history(usdt, usd, decision_time=decision_time)
+    if history.empty:
+        print(f"Not enough data. Need {Z_WINDOW} days of premiums.")
+        return
+    print(f"{len(history)} daily decisions replayed ({history.index[0].date()} to {history.index[-1].date()}).")
+    print(history["Action"].value_counts().to_string())
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    history.to_csv(output)
+    print(f"Saved to {output}")
+
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Midnight Hunter: USDT/TRY nightly premium bot")
+    parser.add_argument("--stream", action="store_true", help="run continuously on the Binance kline stream")
+    parser.add_argument("--replay", metavar="FILE", help="stream mode fed from a recorded kline file (offline)")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier (0 = as fast as possible)")
+    parser.add_argument("--record", metavar="FILE", help="record the live kline stream to FILE")
+    parser.add_argument("--decision-time", default=DECISION_TIME, help="daily decision time in TRT (HH:MM), stream and history modes")
+    parser.add_argument("--usd-rate", type=float, help="pin USD/TRY instead of fetching it from Yahoo")
+    parser.add_argument("--state", help="premium state file (default: $STREAM_STATE_DIR/midnight.json, data/state)")
+    parser.add_argument("--rebuild-state", action="store_true", help="ignore the saved premium state and recompute the full history")
+    parser.add_argument("--history", action="store_true", help="replay the decision of every past day to a CSV instead")
+    parser.add_argument("--history-days", type=int, default=365, help="days of history to replay (default: 365)")
+    parser.add_argument("--output", default=REPLAY_PATH, help="replay CSV (default: data/replay/midnight_history.csv)")
+    args = parser.parse_args()
+
+    if args.history:
+        history_main(days=args.history_days, output=args.output,
+                     decision_time=args.decision_time, usd_rate=args.usd_rate)
+    elif args.stream or args.replay:
+        stream_main(replay=args.replay, speed=args.speed, record=args.record,
+                    decision_time=args.decision_time, usd_rate=args.usd_rate)
+    else:
+        main(state_file=args.state, rebuild=args.rebuild_state)
+    transport.print_summary()
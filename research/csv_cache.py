@@ -0,0 +1,118 @@
+"""
+Parse-once loaders for the research CSVs.
+
+bist30.csv (yfinance export, header on line 3) and multiTimeline.csv (Google
+Trends export, weekly) are parsed and cleaned once; the resulting typed columns
+are written to an uncompressed .npz next to the source. Later loads read the
+arrays back without any CSV parsing. The cache is rebuilt when the source's
+mtime/size change and its content hash differs.
+"""
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+CACHE_SUFFIX = ".cache.npz"
+CACHE_VERSION = 2 # Bump when a loader's cleaning steps change (2: no tz-aware columns)
+CACHEABLE_KINDS = "biufM" # bool, int, float, datetime: no pickling needed
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_cache(cache_path, df, stat, digest, kind):
+    arrays = {f"col_{i}": df[name].to_numpy() for i, name in enumerate(df.columns)}
+    source = np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+    tmp_path = cache_path + ".tmp.npz"
+    np.savez(tmp_path, __columns__=np.array(df.columns, dtype=str), __source__=source,
+             __hash__=np.array(digest), __kind__=np.array(f"{kind}:{CACHE_VERSION}"), **arrays)
+    os.replace(tmp_path, cache_path)
+
+
+def cached_frame(path, kind, parse):
+    """
+    Returns parse(path) (a DataFrame), served from the .npz cache when the
+    source is unchanged. kind names the loader, so one source can have a
+    cache per loader.
+    """
+    cache_path = f"{path}.{kind}{CACHE_SUFFIX}"
+    stat = os.stat(path)
+
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cache:
+            if str(cache["__kind__"]) == f"{kind}:{CACHE_VERSION}":
+                source = cache["__source__"]
+                fresh = source[0] == stat.st_mtime_ns and source[1] == stat.st_size
+                digest = None
+                if not fresh: # Touched or copied: only a content change invalidates
+                    digest = _file_hash(path)
+                    fresh = digest == str(cache["__hash__"])
+                if fresh:
+                    names = cache["__columns__"].tolist()
+                    df = pd.DataFrame({name: cache[f"col_{i}"] for i, name in enumerate(names)})
+                    if digest is not None:
+                        _write_cache(cache_path, df, stat, digest, kind)
+                    return df
+
+    df = parse(path)
+    # Extension dtypes (e.g. tz-aware datetimes, kind "M" too) become object arrays, which need pickling
+    if all(isinstance(dtype, np.dtype) and dtype.kind in CACHEABLE_KINDS for dtype in df.dtypes):
+        _write_cache(cache_path, df, stat, _file_hash(path), kind)
+    return df
+
+
+def _parse_bist(path):
+    # yfinance saves with multi-level headers. The actual header is on line 3 (index 2)
+    df = pd.read_csv(path, header=2)
+    # Col 0 is Date, Col 1 is Close (usually)
+    df.columns.values[0] = "Date"
+    df.columns.values[1] = "Close"
+    df = df.dropna(subset=['Close'])
+    df['Date'] = pd.to_datetime(df['Date'])
+    df = df.sort_values('Date').reset_index(drop=True)
+    df['Close'] = df['Close'].ffill()
+    return df
+
+
+def _parse_trends(path):
+    df = pd.read_csv(path, header=2)
+    # Column 0 is the week, column 1 the interest ('Hafta', 'halka arz: (Türkiye)')
+    df.columns = ['Date', 'SearchVolume']
+    df['Date'] = pd.to_datetime(df['Date'])
+    # Weekly points forward-filled to daily to match BIST trading days
+    return df.set_index('Date').resample('D').ffill().reset_index()
+
+
+def load_bist_csv(path="bist30.csv"):
+    """
+    BIST 30 daily data: Date, Close (plus the other yfinance columns), sorted and forward-filled.
+    """
+    return cached_frame(path, "bist", _parse_bist)
+
+
+def load_trends_csv(path="multiTimeline.csv", column="SearchVolume"):
+    """
+    Weekly Trends export forward-filled to daily: Date and the interest as `column`.
+    """
+    return cached_frame(path, "trends", _parse_trends).rename(columns={'SearchVolume': column})
+
+
+def load_trends(start, end, keyword="Halka Arz"):
+    """
+    Daily interest stitched from overlapping Trends windows: Date and SearchVolume.
+    Falls back to the weekly multiTimeline.csv export (forward-filled) if the fetch fails.
+    """
+    # Imported here: only the scripts that put the repo root on sys.path call this
+    from common.trends import fetch_daily_history
+    try:
+        trends, _ = fetch_daily_history(keyword, start, end)
+        return trends.rename('SearchVolume').rename_axis('Date').reset_index()
+    except Exception as e:
+        print(f"Daily Trends history unavailable ({e}); using weekly multiTimeline.csv.")
+        return load_trends_csv()
@@ -1,22 +1,18 @@
-import pandas as pd
-import numpy as np
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
 import matplotlib.pyplot as plt
 
+from csv_cache import load_bist_csv, load_trends
+from panel import Panel
+
 def load_data():
-    trends = pd.read_csv("multiTimeline.csv", header=2)
-    trends.columns = ['Date', 'SearchVolume']
-    trends['Date'] = pd.to_datetime(trends['Date'])
-    trends = trends.set_index('Date').resample('D').ffill().reset_index()
+    bist = load_bist_csv()
     
-    bist = pd.read_csv("bist30.csv", header=2)
-    bist.columns.values[0] = "Date"
-    bist.columns.values[1] = "Close"
-    bist = bist.dropna(subset=['Close'])
-    bist['Date'] = pd.to_datetime(bist['Date'])
-    bist = bist.sort_values('Date').reset_index(drop=True)
-    bist['Close'] = bist['Close'].ffill()
+    trends = load_trends(bist['Date'].min(), bist['Date'].max())
     
-    df = pd.merge(bist, trends, on='Date', how='inner')
+    df = Panel.from_frame(bist, 'Date').join(trends).frame(dropna=['SearchVolume'])
     return df
 
 def plot_debug(df):
@@ -1,64 +1,28 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
 import pandas as pd
 import numpy as np
-import yfinance as yf
-import requests
-from datetime import datetime, timedelta
-
-# --- DATA PIPELINE (Reused) ---
-def fetch_data():
-    print("Fetching Data...")
-    # 1. Binance USDT (15m)
-    base_url = "https://api.binance.com/api/v3/klines"
-    end_time = int(datetime.now().timestamp() * 1000)
-    all_data = []
-    current_end = end_time
-    for _ in range(10): 
-        params = {"symbol": "USDTTRY", "interval": "15m", "limit": 1000, "endTime": current_end}
-        response = requests.get(base_url, params=params)
-        data = response.json()
-        if not data or isinstance(data, dict): break
-        all_data = data + all_data
-        current_end = data[0][0] - 1
-    usdt = pd.DataFrame(all_data, columns=["OpenTime", "Open", "High", "Low", "Close", "Volume", "CloseTime", "QAV", "Trades", "TBB", "TBQ", "I"])
-    usdt["Date"] = pd.to_datetime(usdt["OpenTime"], unit="ms") + pd.Timedelta(hours=3)
-    usdt["USDT_Close"] = usdt["Close"].astype(float)
-    usdt = usdt.set_index("Date")[["USDT_Close"]]
 
-    # 2. Yahoo USD (Hourly)
-    usd = yf.download("TRY=X", period="1y", interval="1h", progress=False)[["Close"]].rename(columns={"Close": "USD_Close"})
-    if usd.index.tz is None: usd.index = usd.index.tz_localize("UTC")
-    usd.index = usd.index.tz_convert("Etc/GMT-3").tz_localize(None)
+from common.nightly import night_stats
+from common.premium import align_premium
+from panel import Panel
+from snapshot import load_snapshot
 
-    # 3. Yahoo BIST 30 (Daily) for Returns
-    bist = yf.download("XU030.IS", period="1y", interval="1d", progress=False)
-    bist = bist[["Open", "Close", "High", "Low"]]
-    bist.columns = ["BIST_Open", "BIST_Close", "BIST_High", "BIST_Low"]
-    
-    return usdt, usd, bist
+# --- DATA PIPELINE (Shared snapshot, see research/snapshot.py) ---
+def fetch_data():
+    print("Loading Data...")
+    return load_snapshot()
 
 def calculate_signals(usdt, usd, bist):
     # Align & Calc Premium
-    start = max(usdt.index.min(), usd.index.min())
-    end = min(usdt.index.max(), usd.index.max())
-    idx = pd.date_range(start, end, freq="15min")
-    df = pd.DataFrame(index=idx).join(usdt)
-    df["USD_Close"] = usd.reindex(idx, method='ffill')["USD_Close"].ffill()
-    df["Premium"] = (df["USDT_Close"] / df["USD_Close"]) - 1
+    df = align_premium(usdt, usd)
     
-    # Daily Aggregation
-    signals = []
-    for date in bist.index:
-        morning_cutoff = date.replace(hour=9, minute=30)
-        night_start = date.replace(hour=0, minute=0)
-        mask = (df.index >= night_start) & (df.index <= morning_cutoff)
-        night_data = df[mask]
-        
-        if night_data.empty: continue
-        
-        avg_prem = night_data["Premium"].mean()
-        signals.append({"Date": date, "Avg_Premium": avg_prem})
-        
-    sig_df = pd.DataFrame(signals).set_index("Date")
+    # Daily Aggregation (00:00-09:30 night of each BIST date, one pass)
+    stats = night_stats(df.index, df["Premium"], bist.index)
+    stats = stats[stats["rows"] > 0]
+    sig_df = pd.DataFrame({"Avg_Premium": stats["mean"]}, index=stats.index.rename("Date"))
     
     # Z-Score
     sig_df["Rolling_Mean"] = sig_df["Avg_Premium"].rolling(20).mean()
@@ -68,18 +32,18 @@ def calculate_signals(usdt, usd, bist):
     return sig_df.dropna()
 
 # --- BACKTEST ENGINES ---
+# All engines read BIST prices by session position (see research/panel.py)
 
-def backtest_baseline(signals, bist):
+def backtest_baseline(signals, panel):
     # Strategy A: Exit at Close (18:05)
     trades = []
     equity = 1.0
+    opens, closes = panel["BIST_Open"], panel["BIST_Close"]
     
-    for date, row in signals.iterrows():
-        if date not in bist.index: continue
+    for p, z in zip(panel.positions(signals.index), signals["Z_Score"].to_numpy()):
+        if p < 0: continue
         
-        z = row["Z_Score"]
-        day_data = bist.loc[date]
-        ret = (day_data["BIST_Close"] - day_data["BIST_Open"]) / day_data["BIST_Open"]
+        ret = (closes[p] - opens[p]) / opens[p]
         
         pnl = 0
         if z > 1.5: # Short
@@ -93,54 +57,42 @@ def backtest_baseline(signals, bist):
             
     return equity, trades
 
-def backtest_time_extension_multi(signals, bist, days_held=1):
+def backtest_time_extension_multi(signals, panel, days_held=1):
     # Generic Time-Based Exit (T+N)
     trades = []
     equity = 1.0
+    opens, closes = panel["BIST_Open"], panel["BIST_Close"]
+    exits = panel.offset(days_held) # Precomputed T+N session positions
     
-    for i in range(len(signals)):
-        date = signals.index[i]
-        if date not in bist.index: continue
+    for p, z in zip(panel.positions(signals.index), signals["Z_Score"].to_numpy()):
+        if p < 0 or exits[p] < 0: continue # Not a session / exit beyond the data
         
-        z = signals.iloc[i]["Z_Score"]
+        entry_price = opens[p]
+        exit_price = closes[exits[p]]
+        ret = (exit_price - entry_price) / entry_price
         
-        try:
-            entry_price = bist.loc[date]["BIST_Open"]
-            # Find exit day
-            current_loc = bist.index.get_loc(date)
-            exit_loc = current_loc + days_held
-            
-            if exit_loc >= len(bist): continue
-            
-            exit_price = bist.iloc[exit_loc]["BIST_Close"]
-            ret = (exit_price - entry_price) / entry_price
-            
-            pnl = 0
-            if z > 1.5: pnl = -ret
-            elif z < -1.5: pnl = ret
-            
-            if pnl != 0:
-                equity *= (1 + pnl)
-                trades.append(pnl)
-        except: continue
+        pnl = 0
+        if z > 1.5: pnl = -ret
+        elif z < -1.5: pnl = ret
+        
+        if pnl != 0:
+            equity *= (1 + pnl)
+            trades.append(pnl)
             
     return equity, trades
 
-def backtest_buy_and_hold(signals, bist):
+def backtest_buy_and_hold(signals, panel):
     # Benchmark: Buy at first signal date, Hold until last signal date
     if signals.empty: return 1.0, []
     
-    start_date = signals.index[0]
-    end_date = signals.index[-1]
+    start, end = panel.positions(signals.index[[0, -1]])
+    if start < 0 or end < 0: return 1.0, []
     
-    try:
-        start_price = bist.loc[start_date]["BIST_Open"]
-        end_price = bist.loc[end_date]["BIST_Close"]
-        return end_price / start_price, [] # No trades, just 1 period
-    except:
-        return 1.0, []
+    start_price = panel["BIST_Open"][start]
+    end_price = panel["BIST_Close"][end]
+    return end_price / start_price, [] # No trades, just 1 period
 
-def backtest_adaptive(signals, bist):
+def backtest_adaptive(signals, panel):
     # Strategy C: Trailing Stop Simulation
     # Logic: If trade moves in favor by 1%, set Stop at Entry. 
     # If it moves 2%, set Stop at +1%. 
@@ -149,16 +101,16 @@ def backtest_adaptive(signals, bist):
     
     trades = []
     equity = 1.0
+    opens, closes = panel["BIST_Open"], panel["BIST_Close"]
+    highs, lows = panel["BIST_High"], panel["BIST_Low"]
     
-    for date, row in signals.iterrows():
-        if date not in bist.index: continue
-        z = row["Z_Score"]
-        day = bist.loc[date]
+    for p, z in zip(panel.positions(signals.index), signals["Z_Score"].to_numpy()):
+        if p < 0: continue
         
-        open_p = day["BIST_Open"]
-        close_p = day["BIST_Close"]
-        high_p = day["BIST_High"]
-        low_p = day["BIST_Low"]
+        open_p = opens[p]
+        close_p = closes[p]
+        high_p = highs[p]
+        low_p = lows[p]
         
         pnl = 0
         
@@ -194,19 +146,20 @@ def main():
     usdt, usd, bist = fetch_data()
     signals = calculate_signals(usdt, usd, bist)
     print(f"Signals Generated: {len(signals)} days processed.")
+    panel = Panel.from_frame(bist)
     
     # Run Backtests
-    eq_base, tr_base = backtest_baseline(signals, bist)
-    eq_t1, tr_t1 = backtest_time_extension_multi(signals, bist, days_held=1)
-    eq_t2, tr_t2 = backtest_time_extension_multi(signals, bist, days_held=2)
-    eq_t3, tr_t3 = backtest_time_extension_multi(signals, bist, days_held=3)
-    eq_adapt, tr_adapt = backtest_adaptive(signals, bist)
-    eq_bnh, _ = backtest_buy_and_hold(signals, bist)
+    eq_base, tr_base = backtest_baseline(signals, panel)
+    eq_t1, tr_t1 = backtest_time_extension_multi(signals, panel, days_held=1)
+    eq_t2, tr_t2 = backtest_time_extension_multi(signals, panel, days_held=2)
+    eq_t3, tr_t3 = backtest_time_extension_multi(signals, panel, days_held=3)
+    eq_adapt, tr_adapt = backtest_adaptive(signals, panel)
+    eq_bnh, _ = backtest_buy_and_hold(signals, panel)
     
     # Extended Sweep (T+1 to T+10)
     sweep_results = []
     for day in range(1, 11):
-        eq, tr = backtest_time_extension_multi(signals, bist, days_held=day)
+        eq, tr = backtest_time_extension_multi(signals, panel, days_held=day)
         ret = (eq - 1) * 100
         sweep_results.append({"Day": f"T+{day}", "Return": ret, "Trades": len(tr)})
         
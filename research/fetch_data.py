@@ -1,22 +1,31 @@
-import yfinance as yf
-from pytrends.request import TrendReq
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
 import pandas as pd
-import time
+
+from common.trends import TransportTrendReq
+from common.yahoo import fetch_chart
+
+BIST_SYMBOL = "XU030.IS"
 
 def fetch_data():
     print("Fetching BIST 30 data...")
-    # XU030.IS is the ticker for BIST 30 Index
-    bist30 = yf.download("XU030.IS", period="2y", interval="1d")
+    # XU030.IS is the ticker for BIST 30 Index; fetched over the transport so cassettes record it
+    bist30 = fetch_chart(BIST_SYMBOL, "1d", days=730)
     
     if bist30.empty:
         print("Failed to fetch BIST 30 data.")
         return None, None
     
+    # Same column layout as yf.download() so bist30.csv keeps its Price/Ticker/Date header rows
+    bist30 = bist30[["Close", "High", "Low", "Open", "Volume"]]
+    bist30.columns = pd.MultiIndex.from_product([bist30.columns, [BIST_SYMBOL]], names=["Price", "Ticker"])
     print(f"BIST 30 data fetched: {len(bist30)} rows.")
     
     print("Fetching Google Trends data for 'Halka Arz'...")
     try:
-        pytrends = TrendReq(hl='tr-TR', tz=180) # Turkey timezone
+        pytrends = TransportTrendReq(hl='tr-TR', tz=180) # Turkey timezone
         kw_list = ["Halka Arz"]
         # timeframe='today 5-y' or specific dates. Let's try last 2 years.
         # 'today 12-m' is last 12 months. 'today 5-y' is 5 years.
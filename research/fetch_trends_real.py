@@ -1,13 +1,18 @@
-from pytrends.request import TrendReq
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
 import pandas as pd
 import time
 import random
 
+from common.trends import TransportTrendReq
+
 def fetch_trends():
     print("Attempting to fetch Google Trends data for 'Halka Arz'...")
     try:
         # Simple connection
-        pytrends = TrendReq(hl='tr-TR', tz=180)
+        pytrends = TransportTrendReq(hl='tr-TR', tz=180)
         kw_list = ["Halka Arz"]
         
         # Build payload
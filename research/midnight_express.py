@@ -1,157 +1,77 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
 import pandas as pd
 import numpy as np
-import yfinance as yf
-import requests
-from datetime import datetime, timedelta
 
-def fetch_binance_klines(symbol="USDTTRY", interval="15m", limit=1000):
-    """
-    Fetches historical klines from Binance.
-    Note: Binance public API has limits. We might need to loop for long history.
-    For this POC, we'll fetch the max allowed in one go or a reasonable amount.
-    """
-    base_url = "https://api.binance.com/api/v3/klines"
-    # Fetching more data by looping might be needed for a full year, 
-    # but let's start with the last ~10 days (1000 * 15m = 250 hours = ~10 days)
-    # Actually, let's try to get more. 
-    
-    end_time = int(datetime.now().timestamp() * 1000)
-    all_data = []
-    
-    # Fetch last ~90 days in chunks
-    # 15m candles per day = 96. 90 days = 8640 candles.
-    # Binance limit is 1000. We need ~9 loops.
-    
-    current_end = end_time
-    for _ in range(10): 
-        params = {
-            "symbol": symbol,
-            "interval": interval,
-            "limit": 1000,
-            "endTime": current_end
-        }
-        response = requests.get(base_url, params=params)
-        data = response.json()
-        
-        if not data or isinstance(data, dict): # Error or empty
-            break
-            
-        all_data = data + all_data # Prepend to keep order
-        current_end = data[0][0] - 1 # Move back in time
-        
-    df = pd.DataFrame(all_data, columns=[
-        "OpenTime", "Open", "High", "Low", "Close", "Volume", 
-        "CloseTime", "QuoteAssetVolume", "Trades", "TakerBuyBase", "TakerBuyQuote", "Ignore"
-    ])
-    
-    df["Date"] = pd.to_datetime(df["OpenTime"], unit="ms")
-    df["USDT_Close"] = df["Close"].astype(float)
-    df = df[["Date", "USDT_Close"]]
-    
-    # Adjust to Turkey Time (UTC+3)
-    # Binance returns UTC.
-    df["Date"] = df["Date"] + pd.Timedelta(hours=3)
-    
-    return df.set_index("Date")
-
-def fetch_yahoo_data():
-    # USD/TRY
-    print("Fetching USD/TRY from Yahoo...")
-    usd_try = yf.download("TRY=X", period="1y", interval="1h", progress=False)
-    usd_try = usd_try[["Close"]].rename(columns={"Close": "USD_Close"})
-    # Yahoo is usually UTC or local exchange time. Forex is 24/5 roughly.
-    # Let's assume UTC for alignment and shift if needed. 
-    # Actually yfinance returns timezone-aware usually.
-    if usd_try.index.tz is None:
-        usd_try.index = usd_try.index.tz_localize("UTC")
-    usd_try.index = usd_try.index.tz_convert("Etc/GMT-3") # Turkey Time
-    usd_try.index = usd_try.index.tz_localize(None) # Remove tz info for easy merging
-
-    # BIST 30 (XU030.IS)
-    print("Fetching BIST 30 from Yahoo...")
-    bist30 = yf.download("XU030.IS", period="1y", interval="1d", progress=False)
-    bist30 = bist30[["Open", "Close", "Low", "High"]]
-    bist30.columns = ["BIST_Open", "BIST_Close", "BIST_Low", "BIST_High"]
-    # BIST data is daily.
-    
-    return usd_try, bist30
+from common.nightly import gap_returns, night_stats, window_cube, window_slots
+from common.premium import USD_MAX_AGE, align_premium
+from snapshot import load_snapshot
+from threshold_curve import best_threshold, threshold_curve
 
 def align_and_calculate_premium(usdt_df, usd_df):
-    # Resample USDT to hourly to match USD (or keep 15m and ffill USD)
-    # User requested 15m analysis. So we keep 15m.
-    
-    # Create a common 15m index covering the range
-    start_date = max(usdt_df.index.min(), usd_df.index.min())
-    end_date = min(usdt_df.index.max(), usd_df.index.max())
-    
-    full_idx = pd.date_range(start=start_date, end=end_date, freq="15min")
-    df = pd.DataFrame(index=full_idx)
-    
-    # Merge USDT (Exact matches)
-    df = df.join(usdt_df)
-    
-    # Merge USD (Forward Fill)
-    # First reindex USD to 15m
-    usd_resampled = usd_df.reindex(full_idx, method='ffill')
-    df["USD_Close"] = usd_resampled["USD_Close"]
-    
-    # Forward fill USD for weekends/nights
-    df["USD_Close"] = df["USD_Close"].ffill()
-    
-    # Calculate Premium
-    df["Premium"] = (df["USDT_Close"] / df["USD_Close"]) - 1
-    
-    return df
+    # User requested 15m analysis: every USDT bar gets the latest USD quote (as-of join, no dense grid)
+    return align_premium(usdt_df, usd_df, tolerance=USD_MAX_AGE)
 
 def analyze_nightly_fear(premium_df, bist_df):
-    results = []
-    
-    # Iterate over each trading day in BIST
-    for date in bist_df.index:
-        # Define "Night" window: Previous day 18:00 to Current day 09:30
-        # Or specifically 00:00 to 09:30 as requested.
-        
-        morning_cutoff = date.replace(hour=9, minute=30, second=0)
-        night_start = date.replace(hour=0, minute=0, second=0)
-        
-        # Filter premium data for this window
-        night_data = premium_df[(premium_df.index >= night_start) & (premium_df.index <= morning_cutoff)]
-        
-        if night_data.empty:
-            continue
-            
-        avg_premium = night_data["Premium"].mean()
-        max_premium = night_data["Premium"].max()
-        vol_premium = night_data["Premium"].std()
-        
-        # Calculate BIST Gap
-        # Gap = Today Open - Yesterday Close
-        # We need yesterday's close.
-        prev_idx = bist_df.index.get_loc(date) - 1
-        if prev_idx < 0:
-            continue
-            
-        prev_close = bist_df.iloc[prev_idx]["BIST_Close"]
-        today_open = bist_df.loc[date]["BIST_Open"]
-        
-        gap_pct = (today_open - prev_close) / prev_close
-        
-        results.append({
-            "Date": date.date(),
-            "Avg_Night_Premium": avg_premium,
-            "Max_Night_Premium": max_premium,
-            "Premium_Vol": vol_premium,
-            "BIST_Gap": gap_pct
-        })
-        
-    return pd.DataFrame(results)
+    # "Night" window: 00:00 to 09:30 of each BIST trading day, all nights in one pass
+    stats = night_stats(premium_df.index, premium_df["Premium"], bist_df.index)
+    
+    # BIST Gap = Today Open - Yesterday Close (previous trading day)
+    gap = gap_returns(bist_df)
+    
+    # Skip nights without bars and the first day (no previous close)
+    keep = (stats["rows"].to_numpy() > 0) & (np.arange(len(bist_df)) > 0)
+    
+    return pd.DataFrame({
+        "Date": bist_df.index.date[keep],
+        "Avg_Night_Premium": stats["mean"].to_numpy()[keep],
+        "Max_Night_Premium": stats["max"].to_numpy()[keep],
+        "Premium_Vol": stats["std"].to_numpy()[keep],
+        "BIST_Gap": gap.to_numpy()[keep]
+    })
+
+def _offset_label(offset):
+    minutes = int(offset / pd.Timedelta(minutes=1))
+    return f"{'-' if minutes < 0 else ''}{abs(minutes) // 60:02d}:{abs(minutes) % 60:02d}"
+
+def sweep_night_windows(premium_df, bist_df, min_nights=20):
+    """
+    Correlation of the mean night premium with the BIST gap for every (start, end)
+    window on the 15m grid ("-06:00" = 18:00 the evening before), from one
+    window_cube pass instead of one aggregation per window.
+    """
+    starts = ends = window_slots()
+    mean = window_cube(premium_df.index, premium_df["Premium"], bist_df.index, starts, ends)["mean"]
+    gap = gap_returns(bist_df).to_numpy()[:, None, None]
+
+    valid = ~np.isnan(mean) & ~np.isnan(gap)
+    nights = valid.sum(axis=0)
+    # Centered once, so the per-window moments do not cancel
+    x = np.where(valid, mean - np.nanmean(mean), 0.0)
+    y = np.where(valid, gap - np.nanmean(gap), 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mx, my = x.sum(axis=0) / nights, y.sum(axis=0) / nights
+        cov = (x * y).sum(axis=0) / nights - mx * my
+        var_x = (x * x).sum(axis=0) / nights - mx * mx
+        var_y = (y * y).sum(axis=0) / nights - my * my
+        corr = cov / np.sqrt(var_x * var_y)
+
+    i, j = np.nonzero(nights >= min_nights)
+    sweep = pd.DataFrame({
+        "Start": [_offset_label(starts[k]) for k in i],
+        "End": [_offset_label(ends[k]) for k in j],
+        "Nights": nights[i, j],
+        "Correlation": corr[i, j],
+    })
+    return sweep.sort_values("Correlation", ascending=False, na_position="last").reset_index(drop=True)
 
 def main():
     print("--- MIDNIGHT EXPRESS: FEAR GAUGE ---")
     
-    # 1. Fetch Data
-    usdt_df = fetch_binance_klines()
-    usd_df, bist_df = fetch_yahoo_data()
+    # 1. Load Data (shared snapshot, see research/snapshot.py)
+    usdt_df, usd_df, bist_df = load_snapshot()
     
     print(f"USDT Data: {len(usdt_df)} rows")
     print(f"USD Data: {len(usd_df)} rows")
@@ -160,6 +80,7 @@ def main():
     # 2. Align & Calc Premium
     print("Aligning data and calculating premium...")
     premium_df = align_and_calculate_premium(usdt_df, usd_df)
+    print(f"Bars on stale USD quotes (> {USD_MAX_AGE}): {int(premium_df['Stale_USD'].sum())}/{len(premium_df)}")
     
     # 3. Analyze Nightly Fear vs Gap
     print("Analyzing nightly patterns...")
@@ -175,23 +96,46 @@ def main():
     print(f"Correlation (Night Premium vs Gap): {corr:.4f}")
     
     print("\n--- CONDITIONAL PROBABILITY ---")
-    # Thresholds
+    # P(negative gap | premium > t) and the average gap, from one sort of the nights
+    premium, gap = analysis_df["Avg_Night_Premium"], analysis_df["BIST_Gap"]
     thresholds = [0.005, 0.01, 0.02] # 0.5%, 1%, 2%
+    points = threshold_curve(premium, gap, thresholds=thresholds)
     
-    for t in thresholds:
-        high_fear = analysis_df[analysis_df["Avg_Night_Premium"] > t]
-        if high_fear.empty:
+    for t, row in points.iterrows():
+        if row["count"] == 0:
             print(f"No days with Premium > {t*100}%")
             continue
-            
-        negative_gaps = high_fear[high_fear["BIST_Gap"] < 0]
-        prob = len(negative_gaps) / len(high_fear)
-        avg_gap = high_fear["BIST_Gap"].mean()
         
         print(f"Threshold > {t*100}% Premium:")
-        print(f"  - Occurrences: {len(high_fear)}")
-        print(f"  - Probability of Negative Gap: {prob*100:.1f}%")
-        print(f"  - Average Gap Size: {avg_gap*100:.2f}%")
+        print(f"  - Occurrences: {int(row['count'])}")
+        print(f"  - Probability of Negative Gap: {row['p_negative']*100:.1f}% "
+              f"(95% CI {row['p_low']*100:.1f}-{row['p_high']*100:.1f}%)")
+        print(f"  - Average Gap Size: {row['mean_outcome']*100:.2f}% "
+              f"(95% CI {row['mean_low']*100:.2f} to {row['mean_high']*100:.2f}%)")
+    
+    # Full curve over the observed premium range
+    curve = threshold_curve(premium, gap, n_thresholds=2000)
+    best = best_threshold(curve, min_count=10)
+    print("\n--- THRESHOLD CURVE ---")
+    if best is None:
+        print("Too few nights for a threshold pick (need 10 above it).")
+    else:
+        print(f"Most reliable fear threshold: Premium > {best.name*100:.3f}% "
+              f"({int(best['count'])} nights, P(negative gap) {best['p_negative']*100:.1f}%, "
+              f"95% CI {best['p_low']*100:.1f}-{best['p_high']*100:.1f}%)")
+    curve.to_csv("research/midnight_express_curve.csv")
+    print("Curve saved to research/midnight_express_curve.csv")
+
+    # Night window as a parameter: every start/end pair on the 15m grid at once
+    sweep = sweep_night_windows(premium_df, bist_df)
+    print("\n--- NIGHT WINDOW SWEEP ---")
+    if sweep.empty:
+        print("Too few nights for a window sweep (need 20 per window).")
+    else:
+        print(f"{len(sweep)} windows. Strongest premium/gap correlation:")
+        print(sweep.head(5).to_string(index=False, float_format="%.4f"))
+        sweep.to_csv("research/midnight_express_windows.csv", index=False)
+        print("Sweep saved to research/midnight_express_windows.csv")
         
     # Save results
     analysis_df.to_csv("research/midnight_express_results.csv", index=False)
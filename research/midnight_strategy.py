@@ -1,92 +1,50 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
 import pandas as pd
 import numpy as np
-import yfinance as yf
-import requests
-from datetime import datetime, timedelta
 from itertools import product
 
-# --- DATA PIPELINE (Reused from Phase 6) ---
-def fetch_binance_klines(symbol="USDTTRY", interval="15m"):
-    base_url = "https://api.binance.com/api/v3/klines"
-    end_time = int(datetime.now().timestamp() * 1000)
-    all_data = []
-    current_end = end_time
-    
-    # Fetch last ~90 days
-    for _ in range(10): 
-        params = {"symbol": symbol, "interval": interval, "limit": 1000, "endTime": current_end}
-        response = requests.get(base_url, params=params)
-        data = response.json()
-        if not data or isinstance(data, dict): break
-        all_data = data + all_data
-        current_end = data[0][0] - 1
-        
-    df = pd.DataFrame(all_data, columns=["OpenTime", "Open", "High", "Low", "Close", "Volume", "CloseTime", "QAV", "Trades", "TBB", "TBQ", "I"])
-    df["Date"] = pd.to_datetime(df["OpenTime"], unit="ms") + pd.Timedelta(hours=3) # TRT
-    df["USDT_Close"] = df["Close"].astype(float)
-    return df.set_index("Date")[["USDT_Close"]]
-
-def fetch_yahoo_data():
-    usd_try = yf.download("TRY=X", period="1y", interval="1h", progress=False)
-    usd_try = usd_try[["Close"]].rename(columns={"Close": "USD_Close"})
-    if usd_try.index.tz is None: usd_try.index = usd_try.index.tz_localize("UTC")
-    usd_try.index = usd_try.index.tz_convert("Etc/GMT-3").tz_localize(None)
+from common.nightly import day_returns, night_stats
+from common.premium import align_premium
+from snapshot import load_snapshot
 
-    bist30 = yf.download("XU030.IS", period="1y", interval="1d", progress=False)
-    bist30 = bist30[["Open", "Close"]]
-    bist30.columns = ["BIST_Open", "BIST_Close"]
-    return usd_try, bist30
+# Nightly premium the z-score is built on: Avg_Premium, VWAP_Premium, TWAP_Premium,
+# Trade_Premium or Max_Premium (volume/trade weighting needs a snapshot with QuoteVolume/Trades)
+PREMIUM_COLUMN = os.environ.get("MIDNIGHT_PREMIUM", "Avg_Premium")
 
+# --- DATA PIPELINE (Shared snapshot, see research/snapshot.py) ---
 def prepare_data():
-    print("Fetching Data...")
-    usdt = fetch_binance_klines()
-    usd, bist = fetch_yahoo_data()
+    print("Loading Data...")
+    usdt, usd, bist = load_snapshot()
     
     # Align
-    start = max(usdt.index.min(), usd.index.min())
-    end = min(usdt.index.max(), usd.index.max())
-    idx = pd.date_range(start, end, freq="15min")
+    df = align_premium(usdt, usd)
     
-    df = pd.DataFrame(index=idx)
-    df = df.join(usdt)
-    df["USD_Close"] = usd.reindex(idx, method='ffill')["USD_Close"].ffill()
-    df["Premium"] = (df["USDT_Close"] / df["USD_Close"]) - 1
+    # Nightly Aggregation (00:00-09:30 of each BIST date, plain and weighted, one pass)
+    stats = night_stats(df.index, df["Premium"], bist.index, quote_volume=df.get("QuoteVolume"),
+                        trades=df.get("Trades"), bar="15min")
     
-    # Nightly Aggregation
-    nightly_stats = []
-    for date in bist.index:
-        morning_cutoff = date.replace(hour=9, minute=30)
-        night_start = date.replace(hour=0, minute=0)
-        
-        mask = (df.index >= night_start) & (df.index <= morning_cutoff)
-        night_data = df[mask]
-        
-        if night_data.empty: continue
-        
-        avg_prem = night_data["Premium"].mean()
-        
-        # Get Day's Return (Open to Close - Scalping)
-        # Strategy: Enter Open, Exit Close
-        day_open = bist.loc[date]["BIST_Open"]
-        day_close = bist.loc[date]["BIST_Close"]
-        day_return = (day_close - day_open) / day_open
-        
-        nightly_stats.append({
-            "Date": date,
-            "Avg_Premium": avg_prem,
-            "Day_Return": day_return
-        })
-        
-    return pd.DataFrame(nightly_stats).set_index("Date")
+    # Get Day's Return (Open to Close - Scalping)
+    # Strategy: Enter Open, Exit Close
+    day_return = day_returns(bist)
+    
+    has_night = stats["rows"].to_numpy() > 0
+    variants = {"Avg_Premium": "mean", "VWAP_Premium": "vwap", "TWAP_Premium": "twap",
+                "Trade_Premium": "trade_weighted", "Max_Premium": "max"}
+    data = {column: stats[stat].to_numpy()[has_night] for column, stat in variants.items() if stat in stats}
+    data["Day_Return"] = day_return.to_numpy()[has_night]
+    return pd.DataFrame(data, index=bist.index[has_night].rename("Date"))
 
 # --- STRATEGY ENGINE ---
-def backtest(df, z_window, z_threshold_long, z_threshold_short):
+def backtest(df, z_window, z_threshold_long, z_threshold_short, premium=PREMIUM_COLUMN):
     # Calculate Rolling Z-Score of Premium
     # We want to know if LAST NIGHT's premium was anomalous relative to recent history
     
-    df["Rolling_Mean"] = df["Avg_Premium"].rolling(window=z_window).mean()
-    df["Rolling_Std"] = df["Avg_Premium"].rolling(window=z_window).std()
-    df["Z_Score"] = (df["Avg_Premium"] - df["Rolling_Mean"]) / df["Rolling_Std"]
+    df["Rolling_Mean"] = df[premium].rolling(window=z_window).mean()
+    df["Rolling_Std"] = df[premium].rolling(window=z_window).std()
+    df["Z_Score"] = (df[premium] - df["Rolling_Mean"]) / df["Rolling_Std"]
     
     # Shift Z-Score? No, Avg_Premium is for the night BEFORE the trading day.
     # So Z-Score calculated on row T is available for trading on day T.
@@ -130,6 +88,11 @@ def backtest(df, z_window, z_threshold_long, z_threshold_short):
 def optimize():
     df = prepare_data()
     print(f"Data Prepared: {len(df)} days")
+    if PREMIUM_COLUMN not in df:
+        print(f"{PREMIUM_COLUMN} is not available in this snapshot (have: {', '.join(c for c in df if c.endswith('_Premium'))}).")
+        return
+    if PREMIUM_COLUMN != "Avg_Premium":
+        print(f"Premium variant: {PREMIUM_COLUMN}")
     
     # Grid Search
     windows = [5, 10, 20] # Short-term memory for Z-score
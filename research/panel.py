@@ -0,0 +1,117 @@
+"""
+Aligned columnar market panel for the research scripts.
+
+Everything lives on one trading-day axis: row i is the i-th BIST session.
+BIST OHLC, Trends interest and nightly premium stats are stored as contiguous
+arrays on that axis, each source aligned once with a single vectorized date
+lookup. Analyses and backtests then index by position instead of merging
+frames on Date or calling `bist.loc[date]` / `get_loc` / `date in index` per
+row. T+N session offsets are precomputed position arrays.
+"""
+import numpy as np
+import pandas as pd
+
+
+class Panel:
+    def __init__(self, dates):
+        self.dates = pd.DatetimeIndex(dates)
+        self.columns = {}
+        self._dtypes = {} # Source dtype of columns widened to float by date alignment
+        self._offsets = {}
+
+    @classmethod
+    def from_frame(cls, df, date_col=None):
+        """
+        Panel on the rows of df (sorted sessions), dated by df[date_col] or its index.
+        Every other column becomes a panel column.
+        """
+        panel = cls(df[date_col] if date_col else df.index)
+        for name in df.columns:
+            if name != date_col:
+                panel.add(name, df[name].to_numpy())
+        return panel
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def positions(self, dates):
+        """
+        Session positions of the given dates, -1 where a date is not a session.
+        """
+        return self.dates.get_indexer(pd.DatetimeIndex(dates))
+
+    def add(self, name, values, dates=None):
+        """
+        Adds a column. Without dates, values are already on the session axis;
+        with dates, each value goes to its session (others, NaN). Returns self.
+        """
+        values = np.asarray(values)
+        if dates is None:
+            if len(values) != len(self):
+                raise ValueError(f"{name}: {len(values)} values for {len(self)} sessions")
+            self.columns[name] = np.ascontiguousarray(values)
+            return self
+
+        pos = self.positions(dates)
+        hit = pos >= 0
+        column = np.full(len(self), np.nan, dtype=np.float64 if values.dtype.kind in "biuf" else object)
+        column[pos[hit]] = values[hit]
+        self.columns[name] = column
+        self._dtypes[name] = values.dtype
+        return self
+
+    def join(self, df, date_col="Date"):
+        """
+        Adds every column of df (rows dated by df[date_col]) on its sessions. Returns self.
+        """
+        for name in df.columns:
+            if name != date_col:
+                self.add(name, df[name].to_numpy(), dates=df[date_col])
+        return self
+
+    def offset(self, n):
+        """
+        Position of session T+n for every session T (n may be negative), -1 off either end.
+        """
+        if n not in self._offsets:
+            target = np.arange(len(self)) + n
+            self._offsets[n] = np.where((target >= 0) & (target < len(self)), target, -1)
+        return self._offsets[n]
+
+    def take(self, name, pos, n=0):
+        """
+        Values of a column at positions pos (shifted by n sessions); NaN where
+        a position is -1 or falls off the axis.
+        """
+        pos = np.asarray(pos)
+        if n:
+            pos = np.where(pos >= 0, self.offset(n)[np.maximum(pos, 0)], -1)
+        values = self.columns[name].astype(np.float64, copy=False)
+        return np.where(pos >= 0, values[np.maximum(pos, 0)], np.nan)
+
+    def shifted(self, name, n):
+        """
+        The column at T+n for every session (T-n for negative n), NaN off the axis.
+        """
+        return self.take(name, np.arange(len(self)), n)
+
+    def frame(self, names=None, dropna=None, date_col="Date"):
+        """
+        The panel as a DataFrame with a Date column, optionally without the
+        sessions where any of the `dropna` columns is NaN (an inner join).
+        """
+        names = names or list(self.columns)
+        df = pd.DataFrame({date_col: self.dates, **{name: self.columns[name] for name in names}})
+        if dropna:
+            df = df.dropna(subset=dropna).reset_index(drop=True)
+        for name in names:
+            dtype = self._dtypes.get(name)
+            if dtype is not None and dtype.kind in "iub" and not df[name].isna().any():
+                df[name] = df[name].astype(dtype) # Fully matched: back to e.g. int, like a merge
+        return df
@@ -3,24 +3,13 @@ import numpy as np
 import matplotlib.pyplot as plt
 from cassandra.engine import CassandraEngine
 from cassandra.models import SignalStatus, DetectionMethod
+from csv_cache import load_bist_csv
+from panel import Panel
 
 def load_and_process_bist(filepath="bist30.csv"):
-    # yfinance saves with multi-level headers. The actual header is on line 3 (index 2)
-    df = pd.read_csv(filepath, header=2)
-    # Rename columns by index to be safe
-    # Col 0 is Date, Col 1 is Close (usually)
+    # Parsed once (yfinance multi-level header, dropna, sort, ffill), then served from the binary cache
+    df = load_bist_csv(filepath)
     print(f"Columns found: {df.columns.tolist()}")
-    df.columns.values[0] = "Date"
-    df.columns.values[1] = "Close"
-    
-    # Drop the first few rows if they are metadata (NaNs in Close)
-    df = df.dropna(subset=['Close'])
-    
-    df['Date'] = pd.to_datetime(df['Date'])
-    df = df.sort_values('Date').reset_index(drop=True)
-    
-    # Fill missing values if any
-    df['Close'] = df['Close'].ffill()
     
     # Calculate Log Returns
     df['LogReturn'] = np.log(df['Close'] / df['Close'].shift(1))
@@ -52,7 +41,7 @@ def main():
     
     # 3. Merge Data
     # We need to align dates.
-    merged_df = pd.merge(bist_df, trends_df, on='Date', how='inner')
+    merged_df = Panel.from_frame(bist_df, 'Date').join(trends_df).frame(dropna=['Halka Arz'])
     print(f"Merged Data Points: {len(merged_df)}")
     
     # 4. Prepare Series for Cassandra
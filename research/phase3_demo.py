@@ -1,34 +1,16 @@
-import pandas as pd
 import numpy as np
 from cassandra.engine import CassandraEngine
 from cassandra.models import SignalStatus, DetectionMethod
+from csv_cache import load_bist_csv, load_trends_csv
+from panel import Panel
 
 def load_real_trends(filepath="multiTimeline.csv"):
     print(f"Loading Real Trends from {filepath}...")
-    # Read CSV, skipping first 2 lines (header is on line 3)
-    df = pd.read_csv(filepath, header=2)
-    
-    # Rename columns: 'Hafta' -> 'Date', 'halka arz: (Türkiye)' -> 'Halka Arz'
-    # We assume column 0 is Date, column 1 is Value
-    df.columns = ['Date', 'Halka Arz']
-    
-    df['Date'] = pd.to_datetime(df['Date'])
-    df = df.set_index('Date')
-    
-    # Resample to Daily to match BIST trading days (Forward Fill weekly data)
-    df = df.resample('D').ffill().reset_index()
-    
-    return df
+    # Weekly export, forward-filled to daily to match BIST trading days
+    return load_trends_csv(filepath, column='Halka Arz')
 
 def load_and_process_bist(filepath="bist30.csv"):
-    df = pd.read_csv(filepath, header=2)
-    # Rename columns by index to be safe
-    df.columns.values[0] = "Date"
-    df.columns.values[1] = "Close"
-    df = df.dropna(subset=['Close'])
-    df['Date'] = pd.to_datetime(df['Date'])
-    df = df.sort_values('Date').reset_index(drop=True)
-    df['Close'] = df['Close'].ffill()
+    df = load_bist_csv(filepath)
     df['LogReturn'] = np.log(df['Close'] / df['Close'].shift(1))
     df['LogReturn'] = df['LogReturn'].fillna(0)
     df['PanicMetric'] = -1 * df['LogReturn']
@@ -40,7 +22,7 @@ def main():
     # Load Data
     bist_df = load_and_process_bist()
     trends_df = load_real_trends()
-    merged_df = pd.merge(bist_df, trends_df, on='Date', how='inner')
+    merged_df = Panel.from_frame(bist_df, 'Date').join(trends_df).frame(dropna=['Halka Arz'])
     
     bist_series = merged_df['PanicMetric'].values
     search_series = merged_df['Halka Arz'].values
@@ -1,26 +1,24 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from itertools import product
 
+from csv_cache import load_bist_csv, load_trends
+from panel import Panel
+
 def load_data():
-    # Load Trends
-    trends = pd.read_csv("multiTimeline.csv", header=2)
-    trends.columns = ['Date', 'SearchVolume']
-    trends['Date'] = pd.to_datetime(trends['Date'])
-    trends = trends.set_index('Date').resample('D').ffill().reset_index()
-    
     # Load BIST 30
-    bist = pd.read_csv("bist30.csv", header=2)
-    bist.columns.values[0] = "Date"
-    bist.columns.values[1] = "Close"
-    bist = bist.dropna(subset=['Close'])
-    bist['Date'] = pd.to_datetime(bist['Date'])
-    bist = bist.sort_values('Date').reset_index(drop=True)
-    bist['Close'] = bist['Close'].ffill()
-    
-    # Merge
-    df = pd.merge(bist, trends, on='Date', how='inner')
+    bist = load_bist_csv()
+    
+    # Load Trends (daily, over the BIST range)
+    trends = load_trends(bist['Date'].min(), bist['Date'].max())
+    
+    # Align on the BIST sessions (inner join)
+    df = Panel.from_frame(bist, 'Date').join(trends).frame(dropna=['SearchVolume'])
     return df
 
 def calculate_signals(df, window=30):
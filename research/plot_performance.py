@@ -1,22 +1,15 @@
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
+from csv_cache import load_bist_csv, load_trends_csv
+from panel import Panel
+
 def load_data():
-    trends = pd.read_csv("multiTimeline.csv", header=2)
-    trends.columns = ['Date', 'SearchVolume']
-    trends['Date'] = pd.to_datetime(trends['Date'])
-    trends = trends.set_index('Date').resample('D').ffill().reset_index()
+    trends = load_trends_csv()
     
-    bist = pd.read_csv("bist30.csv", header=2)
-    bist.columns.values[0] = "Date"
-    bist.columns.values[1] = "Close"
-    bist = bist.dropna(subset=['Close'])
-    bist['Date'] = pd.to_datetime(bist['Date'])
-    bist = bist.sort_values('Date').reset_index(drop=True)
-    bist['Close'] = bist['Close'].ffill()
+    bist = load_bist_csv()
     
-    df = pd.merge(bist, trends, on='Date', how='inner')
+    df = Panel.from_frame(bist, 'Date').join(trends).frame(dropna=['SearchVolume'])
     
     # Calculate Signals
     df['Z_Score'] = (df['SearchVolume'] - df['SearchVolume'].rolling(30).mean()) / df['SearchVolume'].rolling(30).std()
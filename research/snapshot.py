@@ -0,0 +1,162 @@
+"""
+Versioned market-data snapshots for the Midnight research scripts.
+
+A snapshot is fetched once (USDT/TRY 15m from the kline store, USD/TRY 1h and
+BIST 30 daily OHLC from Yahoo) and written as a directory of .npy columns plus
+a manifest. Loading memory-maps the columns, so parameter sweeps never touch
+the network and every run on the same version sees exactly the same data.
+
+Usage:
+    python research/snapshot.py            # build a new snapshot
+    MIDNIGHT_SNAPSHOT=<version> python research/midnight_express.py
+"""
+import json
+import os
+import sys
+from datetime import datetime, timezone
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np
+import pandas as pd
+
+from common.binance import klines_frame
+from common.kline_store import ROOT_DIR, load_klines
+from common.yahoo import fetch_chart
+
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", os.path.join(ROOT_DIR, "data", "snapshots"))
+FORMAT_VERSION = 1
+
+# Series -> columns stored for it
+SERIES = {
+    "usdt_15m": ["open_time", "close", "quote_volume", "trades"],
+    "usd_1h": ["time", "close"],
+    "bist_1d": ["time", "open", "high", "low", "close"],
+}
+
+
+def _naive_ms(index):
+    return index.values.astype("datetime64[ms]").astype(np.int64)
+
+
+def fetch_sources(days=365):
+    """
+    Fetches every series in the same shape the research scripts used to build
+    themselves. Times are int64 milliseconds: USDT OpenTime in UTC, USD in naive
+    Turkey Time, BIST as the naive trading date.
+    """
+    print("Fetching USDT/TRY 15m from the kline store...")
+    usdt = load_klines("USDTTRY", "15m", days, columns=SERIES["usdt_15m"])
+
+    print("Fetching USD/TRY from Yahoo...")
+    usd = fetch_chart("TRY=X", "1h", days=days)
+    if usd.empty:
+        raise RuntimeError("No USD/TRY data from Yahoo (TRY=X), cannot build a snapshot.")
+    if usd.index.tz is None:
+        usd.index = usd.index.tz_localize("UTC")
+    usd.index = usd.index.tz_convert("Etc/GMT-3").tz_localize(None) # Turkey Time
+
+    print("Fetching BIST 30 from Yahoo...")
+    bist = fetch_chart("XU030.IS", "1d", days=days)
+    if bist.empty:
+        raise RuntimeError("No BIST 30 data from Yahoo (XU030.IS), cannot build a snapshot.")
+    if bist.index.tz is not None:
+        bist.index = bist.index.tz_localize(None) # Keep the exchange-local trading date
+
+    return {
+        "usdt_15m": usdt,
+        "usd_1h": {"time": _naive_ms(usd.index), "close": usd["Close"].to_numpy(dtype=np.float64)},
+        "bist_1d": {
+            "time": _naive_ms(bist.index),
+            "open": bist["Open"].to_numpy(dtype=np.float64),
+            "high": bist["High"].to_numpy(dtype=np.float64),
+            "low": bist["Low"].to_numpy(dtype=np.float64),
+            "close": bist["Close"].to_numpy(dtype=np.float64),
+        },
+    }
+
+
+def build_snapshot(days=365, root=SNAPSHOT_DIR):
+    """
+    Fetches all sources once and writes them as a new snapshot version.
+    Returns the version string.
+    """
+    series = fetch_sources(days)
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(root, version)
+    os.makedirs(path)
+
+    manifest = {"format": FORMAT_VERSION, "version": version, "days": days, "series": {}}
+    for name, columns in series.items():
+        for col in SERIES[name]:
+            np.save(os.path.join(path, f"{name}.{col}.npy"), np.ascontiguousarray(columns[col]))
+        manifest["series"][name] = {"rows": int(len(columns[SERIES[name][0]])), "columns": SERIES[name]}
+
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    with open(os.path.join(root, "LATEST"), "w") as f:
+        f.write(version)
+
+    print(f"Snapshot {version} written to {path}")
+    return version
+
+
+def latest_version(root=SNAPSHOT_DIR):
+    path = os.path.join(root, "LATEST")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read().strip()
+
+
+def load_columns(version=None, root=SNAPSHOT_DIR):
+    """
+    Returns (manifest, {series: {column: memory-mapped array}}).
+    Uses $MIDNIGHT_SNAPSHOT or the latest version when none is given, and
+    builds a first snapshot if there is none yet.
+    """
+    version = version or os.environ.get("MIDNIGHT_SNAPSHOT") or latest_version(root)
+    if version is None:
+        print("No snapshot found, building one...")
+        version = build_snapshot(root=root)
+
+    path = os.path.join(root, version)
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest["format"] != FORMAT_VERSION:
+        raise ValueError(f"Snapshot {version} has format {manifest['format']}, expected {FORMAT_VERSION}")
+
+    series = {
+        name: {col: np.load(os.path.join(path, f"{name}.{col}.npy"), mmap_mode="r") for col in spec["columns"]}
+        for name, spec in manifest["series"].items()
+    }
+    return manifest, series
+
+
+def load_snapshot(version=None, root=SNAPSHOT_DIR):
+    """
+    Returns (usdt, usd, bist) DataFrames as the research scripts expect them:
+    USDT_Close (plus QuoteVolume/Trades in newer snapshots) and USD_Close indexed
+    by Turkey Time, BIST_Open/Close/High/Low by date.
+    """
+    manifest, series = load_columns(version, root)
+    print(f"Loaded snapshot {manifest['version']}.")
+
+    usdt = klines_frame(series["usdt_15m"])
+
+    usd_cols = series["usd_1h"]
+    usd = pd.DataFrame({"USD_Close": usd_cols["close"]},
+                       index=pd.DatetimeIndex(usd_cols["time"].astype("datetime64[ms]")))
+
+    bist_cols = series["bist_1d"]
+    bist = pd.DataFrame({
+        "BIST_Open": bist_cols["open"],
+        "BIST_Close": bist_cols["close"],
+        "BIST_High": bist_cols["high"],
+        "BIST_Low": bist_cols["low"],
+    }, index=pd.DatetimeIndex(bist_cols["time"].astype("datetime64[ms]"), name="Date"))
+
+    return usdt, usd, bist
+
+
+if __name__ == "__main__":
+    build_snapshot()
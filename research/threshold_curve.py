@@ -0,0 +1,92 @@
+"""
+Conditional gap curves over many signal thresholds at once.
+
+For every threshold t: how many nights had signal > t, the share of them with
+a negative outcome (BIST gap) and the outcome's mean. Nights are sorted by
+signal once; every threshold is then a binary search plus suffix sums, so a
+curve over thousands of thresholds costs O(n log n + T log n) instead of one
+DataFrame filter per threshold.
+
+Bootstrap bands reuse the same sort: a resample only changes how often each
+night is counted, so the B resamples are multinomial weight rows whose suffix
+sums give every curve in one vectorized pass.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+def _suffix_sums(values):
+    """
+    Sums of values[..., k:] for k = 0..n (the last one is 0), along the last axis.
+    """
+    totals = np.cumsum(values[..., ::-1], axis=-1)[..., ::-1]
+    return np.concatenate([totals, np.zeros(values.shape[:-1] + (1,))], axis=-1)
+
+
+def threshold_curve(signal, outcome, thresholds=None, n_thresholds=1000, n_boot=1000, ci=0.95,
+                    min_count=1, seed=0):
+    """
+    Returns a frame indexed by threshold with count (nights with signal > t),
+    p_negative (share of them with outcome < 0) and mean_outcome, plus
+    bootstrap percentile bands p_low/p_high and mean_low/mean_high.
+
+    Nights with NaN signal or outcome are dropped. thresholds default to
+    n_thresholds points spread over the signal's range. Cells with fewer than
+    min_count nights are NaN. n_boot=0 skips the bands.
+    """
+    signal = np.asarray(signal, dtype=np.float64)
+    outcome = np.asarray(outcome, dtype=np.float64)
+    keep = ~(np.isnan(signal) | np.isnan(outcome))
+    order = np.argsort(signal[keep], kind="stable")
+    s, o = signal[keep][order], outcome[keep][order]
+    n = len(s)
+
+    if thresholds is None:
+        thresholds = np.linspace(s[0], s[-1], n_thresholds) if n else np.empty(0)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    first = np.searchsorted(s, thresholds, side="right") # Nights first..n-1 have signal > t
+
+    negative = (o < 0).astype(np.float64)
+    count = _suffix_sums(np.ones(n))[first]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p_negative = _suffix_sums(negative)[first] / count
+        mean_outcome = _suffix_sums(o)[first] / count
+    enough = count >= max(min_count, 1)
+
+    curve = pd.DataFrame({
+        "count": count.astype(np.int64),
+        "p_negative": np.where(enough, p_negative, np.nan),
+        "mean_outcome": np.where(enough, mean_outcome, np.nan),
+    }, index=pd.Index(thresholds, name="threshold"))
+
+    if n_boot and n:
+        rng = np.random.default_rng(seed)
+        weights = rng.multinomial(n, np.full(n, 1.0 / n), size=n_boot).astype(np.float64) # (B, n)
+        boot_count = _suffix_sums(weights)[:, first]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            boot_p = _suffix_sums(weights * negative)[:, first] / boot_count
+            boot_mean = _suffix_sums(weights * o)[:, first] / boot_count
+        tails = [(1 - ci) / 2 * 100, (1 + ci) / 2 * 100]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning) # All-NaN columns past the last night
+            p_band = np.nanpercentile(boot_p, tails, axis=0)
+            mean_band = np.nanpercentile(boot_mean, tails, axis=0)
+        for name, band in (("p", p_band), ("mean", mean_band)):
+            curve[f"{name}_low"] = np.where(enough, band[0], np.nan)
+            curve[f"{name}_high"] = np.where(enough, band[1], np.nan)
+
+    return curve
+
+
+def best_threshold(curve, column="p_negative", min_count=10, by="low"):
+    """
+    Threshold row with the highest `column` lower band (by="low", the conservative
+    pick) or point estimate (by=None) among thresholds with at least min_count nights.
+    """
+    ranked = curve[curve["count"] >= min_count]
+    key = column if by is None else f"{column.split('_')[0]}_{by}"
+    if ranked.empty or ranked[key].isna().all():
+        return None
+    return ranked.loc[ranked[key].idxmax()]
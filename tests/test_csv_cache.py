@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "research"))
+
+from csv_cache import CACHE_SUFFIX, cached_frame, load_bist_csv
+
+BIST_CSV = """Price,Close,High,Low,Open,Volume
+Ticker,XU030.IS,XU030.IS,XU030.IS,XU030.IS,XU030.IS
+Date,,,,,
+2024-01-02,8000.5,8100,7900,7950,1000
+2024-01-03,,8200,7950,8050,1100
+2024-01-04,8150.25,8250,8000,8100,1200
+"""
+
+
+def test_bist_loads_twice_from_cache(tmp_path):
+    path = tmp_path / "bist30.csv"
+    path.write_text(BIST_CSV)
+
+    first = load_bist_csv(str(path))
+    assert os.path.exists(f"{path}.bist{CACHE_SUFFIX}")
+    second = load_bist_csv(str(path))
+
+    pd.testing.assert_frame_equal(first, second)
+    assert list(second["Close"]) == [8000.5, 8150.25]
+
+
+def test_tz_aware_frame_loads_twice(tmp_path):
+    path = tmp_path / "tz.csv"
+    path.write_text(BIST_CSV)
+
+    def parse(p):
+        df = load_bist_csv(p)
+        df["Date"] = df["Date"].dt.tz_localize("Europe/Istanbul")
+        return df
+
+    first = cached_frame(str(path), "tz", parse)
+    second = cached_frame(str(path), "tz", parse) # Used to fail: the cache pickled the tz-aware column
+
+    pd.testing.assert_frame_equal(first, second)
+    assert str(second["Date"].dt.tz) == "Europe/Istanbul"